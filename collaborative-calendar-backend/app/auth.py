@@ -1,13 +1,14 @@
 # app/auth.py
 
 import jwt
-from azure.functions import HttpRequest, HttpResponse
+from azure.functions import HttpRequest
 from functools import wraps
-import json
 import logging
 from dotenv import load_dotenv
 import os
 
+from app.serialization import dumps, json_response
+
 load_dotenv()
 
 JWT_SECRET = os.getenv("JWT_SECRET")
@@ -22,11 +23,7 @@ def token_required(func):
         auth_header = req.headers.get("Authorization")
         if not auth_header:
             logger.warning("Authorization header missing")
-            return HttpResponse(
-                json.dumps({"error": "Authorization header missing"}),
-                status_code=401,
-                mimetype="application/json"
-            )
+            return json_response(dumps({"error": "Authorization header missing"}), 401)
         
         try:
             token_type, token = auth_header.split(" ")
@@ -35,11 +32,7 @@ def token_required(func):
                 raise ValueError("Invalid token type")
         except ValueError:
             logger.warning("Invalid Authorization header format")
-            return HttpResponse(
-                json.dumps({"error": "Invalid Authorization header format"}),
-                status_code=401,
-                mimetype="application/json"
-            )
+            return json_response(dumps({"error": "Invalid Authorization header format"}), 401)
 
         try:
             payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
@@ -48,18 +41,10 @@ def token_required(func):
                 raise jwt.InvalidTokenError("userId missing in token")
         except jwt.ExpiredSignatureError:
             logger.warning("Token has expired")
-            return HttpResponse(
-                json.dumps({"error": "Token has expired"}),
-                status_code=401,
-                mimetype="application/json"
-            )
+            return json_response(dumps({"error": "Token has expired"}), 401)
         except jwt.InvalidTokenError as e:
             logger.warning(f"Invalid token: {str(e)}")
-            return HttpResponse(
-                json.dumps({"error": "Invalid token"}),
-                status_code=401,
-                mimetype="application/json"
-            )
+            return json_response(dumps({"error": "Invalid token"}), 401)
         
         # Pass user_id as a keyword argument
         return func(req, *args, user_id=user_id, **kwargs)
@@ -0,0 +1,96 @@
+# app/cache.py
+
+import threading
+from cachetools import TTLCache
+
+# -----------------------
+# User lookups
+# -----------------------
+# username <-> userId mappings change rarely, so they are kept in-process for
+# a few minutes instead of querying Cosmos on every call. Only users that
+# exist are cached; a miss always goes back to the database.
+USER_CACHE_SIZE = 10_000
+USER_CACHE_TTL = 600  # seconds
+
+_user_lock = threading.Lock()
+_user_ids_by_username = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+_usernames_by_id = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def cached_user_id(username: str):
+    """
+    Returns the cached userId for a username, or None on a miss.
+    """
+    with _user_lock:
+        return _user_ids_by_username.get(username)
+
+
+def cached_username(user_id: str):
+    """
+    Returns the cached username for a userId, or None on a miss.
+    """
+    with _user_lock:
+        return _usernames_by_id.get(user_id)
+
+
+def remember_user(user_id: str, username: str):
+    """
+    Stores both directions of a userId <-> username mapping.
+    """
+    with _user_lock:
+        _user_ids_by_username[username] = user_id
+        _usernames_by_id[user_id] = username
+
+
+def invalidate_user(user_id: str = None, username: str = None):
+    """
+    Drops any cached mapping for the given userId and/or username.
+    Call this whenever a user's username changes or a user is removed.
+    """
+    with _user_lock:
+        if user_id is not None:
+            old_username = _usernames_by_id.pop(user_id, None)
+            if old_username is not None:
+                _user_ids_by_username.pop(old_username, None)
+        if username is not None:
+            old_user_id = _user_ids_by_username.pop(username, None)
+            if old_user_id is not None:
+                _usernames_by_id.pop(old_user_id, None)
+
+
+# -----------------------
+# Calendar documents
+# -----------------------
+# Membership/ownership checks read the same calendar over and over (every event
+# read and write checks it). Docs are kept for a short time only; writes made
+# through this worker invalidate them right away. Cached docs are shared, so
+# callers must treat them as read-only.
+CALENDAR_CACHE_SIZE = 2048
+CALENDAR_CACHE_TTL = 30  # seconds
+
+_calendar_lock = threading.Lock()
+_calendars_by_id = TTLCache(maxsize=CALENDAR_CACHE_SIZE, ttl=CALENDAR_CACHE_TTL)
+
+
+def cached_calendar(calendar_id: str):
+    """
+    Returns the cached calendar document, or None on a miss.
+    """
+    with _calendar_lock:
+        return _calendars_by_id.get(calendar_id)
+
+
+def remember_calendar(cal_doc: dict):
+    """
+    Caches a calendar document under its calendarId.
+    """
+    with _calendar_lock:
+        _calendars_by_id[cal_doc["calendarId"]] = cal_doc
+
+
+def invalidate_calendar(calendar_id: str):
+    """
+    Drops a cached calendar. Call this after every write to the calendar.
+    """
+    with _calendar_lock:
+        _calendars_by_id.pop(calendar_id, None)
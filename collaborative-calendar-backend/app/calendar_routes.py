@@ -1,23 +1,40 @@
 # calendar_routes.py
 
 import logging
-import json
+import threading
+import time
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from icalendar import Calendar as ICalCalendar
 from pydantic import ValidationError
-from azure.cosmos.exceptions import CosmosHttpResponseError
-from typing import Tuple, List
-from app.database import calendars_container, events_container, user_container
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosHttpResponseError,
+    CosmosResourceNotFoundError
+)
+from typing import Tuple, List, Iterable
+from cachetools import LRUCache
+from app.cache import (
+    cached_user_id, cached_username, remember_user,
+    cached_calendar, remember_calendar, invalidate_calendar
+)
+from app import database
+from app.database import query_first, query_params, exists
 from app.models import Event, Calendar, CalendarColor
-from app.notifications import send_notification_email
+from app.notifications import (
+    send_notification_email, build_notification_email, send_emails, send_in_background
+)
+from app.provisioning import BULK_DELETE_SPROC_ID, ensure_stored_procedures
 
 # ------------------ Stream Chat imports -------------------
 import os
 from stream_chat import StreamChat
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
 # If you haven't already added a stream handler:
 if not logger.hasHandlers():
@@ -38,6 +55,86 @@ if STREAM_API_KEY and STREAM_API_SECRET:
 else:
     logger.warning("STREAM_API_KEY or STREAM_API_SECRET not set. Chat features will be disabled.")
 
+# Personal calendars may use any CalendarColor (including 'blue')
+PERSONAL_COLORS = frozenset(c.value for c in CalendarColor)
+PERSONAL_COLORS_TEXT = ", ".join(c.value for c in CalendarColor)
+# Group calendars may use any color except 'blue', which is reserved for personal calendars
+GROUP_COLORS = frozenset(c.value for c in CalendarColor if c != CalendarColor.blue)
+GROUP_COLORS_TEXT = ", ".join(c.value for c in CalendarColor if c != CalendarColor.blue)
+
+# Read-modify-write attempts before giving up on a calendar that keeps changing underneath us
+CALENDAR_WRITE_ATTEMPTS = 3
+
+# Parsed (start, end) datetimes of events, keyed by id + _etag so edits are never served stale
+_EVENT_TIMES = LRUCache(maxsize=50_000)
+_event_times_lock = threading.Lock()
+
+# Event times are stored as ISO strings that may carry different UTC offsets, so the
+# server-side overlap prefilter widens its window by the largest possible offset gap
+CONFLICT_WINDOW_MARGIN = timedelta(hours=26)
+
+# Cosmos transactional batches are limited to 100 operations
+EVENT_BATCH_SIZE = 100
+# Page size used when a calendar's events are read in full
+EVENTS_READ_PAGE_SIZE = 1000
+# Imports start with smaller batches and grow to EVENT_BATCH_SIZE while batches stay fast
+IMPORT_INITIAL_BATCH_SIZE = 50
+IMPORT_FAST_BATCH_SECONDS = 0.25
+
+# iCal downloads are streamed and abandoned once they exceed this size
+ICAL_MAX_BYTES = 20 * 1024 * 1024
+ICAL_CHUNK_SIZE = 64 * 1024
+# (connect, read) timeouts in seconds for iCal downloads
+ICAL_TIMEOUT = (5, 30)
+
+# -----------------------
+# Queries
+# -----------------------
+# Query texts are defined once so every call site of an operation sends identical
+# SQL, which keeps the service's cached query plans reusable across requests.
+USER_CALENDARS_QUERY = (
+    "SELECT c.id, c.calendarId, c.name, c.ownerId, c.isGroup, c.isDefault, c.members, c.color "
+    "FROM Calendars c WHERE ARRAY_CONTAINS(c.members, @userId)"
+)
+USER_CALENDAR_IDS_QUERY = "SELECT VALUE c.calendarId FROM Calendars c WHERE ARRAY_CONTAINS(c.members, @userId)"
+MEMBERS_CALENDARS_QUERY = (
+    "SELECT c.calendarId, c.members FROM Calendars c "
+    "WHERE EXISTS(SELECT VALUE m FROM m IN c.members WHERE ARRAY_CONTAINS(@memberIds, m))"
+)
+CALENDAR_EXISTS_QUERY = "SELECT VALUE COUNT(1) FROM Calendars c WHERE c.calendarId = @calId"
+EVENTS_IN_CALENDARS_QUERY = "SELECT * FROM Events e WHERE ARRAY_CONTAINS(@ids, e.calendarId)"
+EVENTS_IN_WINDOW_QUERY = (
+    "SELECT e.id, e._etag, e.calendarId, e.title, e.startTime, e.endTime FROM Events e "
+    "WHERE ARRAY_CONTAINS(@calIds, e.calendarId) "
+    "AND e.startTime < @windowEnd AND e.endTime > @windowStart"
+)
+CALENDAR_EVENTS_QUERY = "SELECT * FROM Events e WHERE e.calendarId = @calId"
+CALENDAR_EVENT_IDS_QUERY = "SELECT VALUE e.id FROM Events e WHERE e.calendarId = @calId"
+USER_ID_BY_USERNAME_QUERY = "SELECT TOP 1 VALUE u.userId FROM Users u WHERE u.username = @username"
+USERNAME_BY_ID_QUERY = "SELECT TOP 1 VALUE u.username FROM Users u WHERE u.userId = @userId"
+USER_CONTACTS_QUERY = "SELECT u.userId, u.username, u.email FROM Users u WHERE ARRAY_CONTAINS(@ids, u.userId)"
+OWNER_AND_MEMBERS_QUERY = (
+    "SELECT u.userId, u.username, u.email FROM Users u "
+    "WHERE u.userId = @ownerId OR ARRAY_CONTAINS(@usernames, u.username)"
+)
+USER_CONTACT_QUERY = "SELECT u.username, u.email FROM Users u WHERE u.userId = @userId"
+USER_EXISTS_QUERY = "SELECT VALUE COUNT(1) FROM Users u WHERE u.userId = @userId"
+
+# Reused across imports so repeat fetches from the same host keep their TLS connection
+ical_session = requests.Session()
+_ical_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+)
+ical_session.mount("https://", _ical_adapter)
+ical_session.mount("http://", _ical_adapter)
+
+# Shared pool for running independent Cosmos/SMTP calls of one request concurrently.
+# It is shared by every request thread of the worker, so scale it with
+# PYTHON_THREADPOOL_THREAD_COUNT.
+IO_EXECUTOR_WORKERS = int(os.getenv("IO_EXECUTOR_WORKERS", "8"))
+io_executor = ThreadPoolExecutor(max_workers=IO_EXECUTOR_WORKERS)
 
 
 def create_personal_calendar(user_id: str, name: str, color: str) -> Tuple[dict, int]:
@@ -46,11 +143,10 @@ def create_personal_calendar(user_id: str, name: str, color: str) -> Tuple[dict,
     """
     logger.info("Creating personal calendar '%s' for user '%s' with color '%s'", name, user_id, color)
 
-    # Define allowed colors including 'blue'
-    allowed_colors = [color.value for color in CalendarColor]
-    if color not in allowed_colors:
+    # Allowed colors include 'blue'
+    if color not in PERSONAL_COLORS:
         logger.warning("Invalid color '%s' for calendar '%s'", color, name)
-        return {"error": f"Invalid color. Allowed colors are: {', '.join(allowed_colors)}"}, 400
+        return {"error": f"Invalid color. Allowed colors are: {PERSONAL_COLORS_TEXT}"}, 400
 
     # Create the Calendar model
     personal_cal = Calendar(
@@ -61,11 +157,11 @@ def create_personal_calendar(user_id: str, name: str, color: str) -> Tuple[dict,
         members=[user_id],
         color=color
     )
-    cal_item = personal_cal.dict()
+    cal_item = personal_cal.model_dump()
     cal_item["id"] = personal_cal.calendarId  # Cosmos 'id' fix
 
     try:
-        calendars_container.create_item(cal_item)
+        database.calendars_container.create_item(cal_item)
         logger.info("Personal calendar '%s' created with ID '%s' and color '%s'", name, personal_cal.calendarId, color)
 
         return {
@@ -88,17 +184,12 @@ def delete_personal_calendar(user_id: str, calendar_id: str) -> Tuple[dict, int]
     """
     logger.info("User '%s' attempting to delete calendar '%s'", user_id, calendar_id)
 
-    # 1) Fetch the calendar doc
+    # 1) Fetch the calendar doc with a fresh point read: the delete can't be undone,
+    #    so ownership is never checked against a cached (possibly stale) doc
     try:
-        cal_query = list(calendars_container.query_items(
-            query="SELECT * FROM Calendars c WHERE c.calendarId = @calId",
-            parameters=[{"name": "@calId", "value": calendar_id}],
-            enable_cross_partition_query=True
-        ))
-        if not cal_query:
-            return {"error": "Calendar not found"}, 404
-
-        cal_doc = cal_query[0]
+        cal_doc = database.calendars_container.read_item(item=calendar_id, partition_key=calendar_id)
+    except CosmosResourceNotFoundError:
+        return {"error": "Calendar not found"}, 404
     except CosmosHttpResponseError as e:
         logger.exception("Error fetching calendar '%s': %s", calendar_id, str(e))
         return {"error": str(e)}, 500
@@ -111,23 +202,18 @@ def delete_personal_calendar(user_id: str, calendar_id: str) -> Tuple[dict, int]
     if cal_doc.get("isDefault"):
         return {"error": "Cannot delete the default home calendar"}, 400
 
-    # 4) Delete associated events
+    # 4) Delete associated events server-side (bulkDeleteByCalendar stored procedure)
     try:
-        events_query = list(events_container.query_items(
-            query="SELECT * FROM Events e WHERE e.calendarId = @calId",
-            parameters=[{"name": "@calId", "value": calendar_id}],
-            enable_cross_partition_query=True
-        ))
-        for event in events_query:
-            events_container.delete_item(item=event["id"], partition_key=event["calendarId"])
-        logger.info("All events associated with calendar '%s' have been deleted", calendar_id)
+        deleted = delete_calendar_events(calendar_id)
+        logger.info("All %d events associated with calendar '%s' have been deleted", deleted, calendar_id)
     except CosmosHttpResponseError as e:
         logger.exception("Error deleting events for calendar '%s': %s", calendar_id, str(e))
         return {"error": str(e)}, 500
 
     # 5) Delete the calendar
     try:
-        calendars_container.delete_item(item=cal_doc["id"], partition_key=calendar_id)
+        database.calendars_container.delete_item(item=cal_doc["id"], partition_key=calendar_id)
+        invalidate_calendar(calendar_id)
         logger.info("Calendar '%s' deleted successfully", calendar_id)
 
         return {"message": "Personal calendar deleted successfully"}, 200
@@ -141,29 +227,22 @@ def get_user_calendars(user_id: str) -> Tuple[dict, int]:
     """
     Retrieves all calendars where the user is a member, including member usernames.
     """
-    logger.info("Fetching calendars for user '%s'", user_id)
+    logger.debug("Fetching calendars for user '%s'", user_id)
     try:
-        # Fetch calendars where user is a member
-        calendars_query = list(calendars_container.query_items(
-            query="SELECT * FROM Calendars c WHERE ARRAY_CONTAINS(c.members, @userId)",
-            parameters=[{"name": "@userId", "value": user_id}],
+        # Fetch calendars where user is a member (only the Calendar model fields, no system properties)
+        calendars_query = list(database.calendars_container.query_items(
+            query=USER_CALENDARS_QUERY,
+            parameters=query_params(userId=user_id),
             enable_cross_partition_query=True
         ))
         
-        # For each calendar, fetch member usernames
+        # Fetch the usernames of every member of every calendar in one query
+        member_ids = {m for cal in calendars_query for m in cal.get("members", [])}
+        usernames = get_usernames(member_ids)
+
         for cal in calendars_query:
-            member_usernames = []
-            for member_id in cal.get("members", []):
-                user_query = list(user_container.query_items(
-                    query="SELECT c.username FROM Users c WHERE c.userId = @userId",
-                    parameters=[{"name": "@userId", "value": member_id}],
-                    enable_cross_partition_query=True
-                ))
-                if user_query:
-                    member_usernames.append(user_query[0]['username'])
-                else:
-                    member_usernames.append(member_id)  # Fallback to userId if username not found
-            cal["memberUsernames"] = member_usernames
+            # Fallback to userId if username not found
+            cal["memberUsernames"] = [usernames.get(member_id, member_id) for member_id in cal.get("members", [])]
             # Ensure 'isGroup' is present
             cal["isGroup"] = cal.get("isGroup", False)
         
@@ -180,16 +259,11 @@ def edit_group_calendar(calendar_id: str, admin_id: str, updated_data: dict) ->
     """
     logger.info("Admin '%s' is editing group calendar '%s'", admin_id, calendar_id)
 
-    # 1) Fetch calendar document
+    # 1) Fetch calendar document (point read)
     try:
-        cal_query = list(calendars_container.query_items(
-            query="SELECT * FROM Calendars c WHERE c.calendarId = @calId",
-            parameters=[{"name": "@calId", "value": calendar_id}],
-            enable_cross_partition_query=True
-        ))
-        if not cal_query:
-            return {"error": "Calendar not found"}, 404
-        cal_doc = cal_query[0]
+        cal_doc = database.calendars_container.read_item(item=calendar_id, partition_key=calendar_id)
+    except CosmosResourceNotFoundError:
+        return {"error": "Calendar not found"}, 404
     except CosmosHttpResponseError as e:
         logger.exception("Error fetching calendar '%s': %s", calendar_id, str(e))
         return {"error": str(e)}, 500
@@ -203,32 +277,38 @@ def edit_group_calendar(calendar_id: str, admin_id: str, updated_data: dict) ->
         return {"error": "Only the calendar owner can edit the calendar"}, 403
 
     # 4) Update name and/or color
-    allowed_colors = [color.value for color in CalendarColor if color != CalendarColor.blue]
-    updated = False
+    patch_operations = []
 
     if "name" in updated_data:
         new_name = updated_data["name"].strip()
         if not new_name:
             return {"error": "Calendar name cannot be empty"}, 400
-        cal_doc["name"] = new_name
-        updated = True
+        patch_operations.append({"op": "set", "path": "/name", "value": new_name})
 
     if "color" in updated_data:
         new_color = updated_data["color"]
-        if new_color not in allowed_colors:
+        if new_color not in GROUP_COLORS:
             logger.warning("Invalid color '%s' for calendar '%s'", new_color, calendar_id)
-            return {"error": f"Invalid color. Allowed colors are: {', '.join(allowed_colors)}"}, 400
-        cal_doc["color"] = new_color
-        updated = True
+            return {"error": f"Invalid color. Allowed colors are: {GROUP_COLORS_TEXT}"}, 400
+        patch_operations.append({"op": "set", "path": "/color", "value": new_color})
 
-    if not updated:
+    if not patch_operations:
         return {"error": "No valid fields to update"}, 400
 
-    # 5) Upsert the updated calendar
+    # 5) Patch only the changed fields, guarded by the ETag we checked ownership against
     try:
-        calendars_container.upsert_item(cal_doc)
+        database.calendars_container.patch_item(
+            item=calendar_id,
+            partition_key=calendar_id,
+            patch_operations=patch_operations,
+            etag=cal_doc["_etag"],
+            match_condition=MatchConditions.IfNotModified
+        )
+        invalidate_calendar(calendar_id)
         logger.info("Group calendar '%s' updated successfully", calendar_id)
         return {"message": "Group calendar updated successfully"}, 200
+    except CosmosAccessConditionFailedError:
+        return {"error": "Calendar was modified concurrently, please retry"}, 409
     except CosmosHttpResponseError as e:
         logger.exception("Error updating group calendar '%s': %s", calendar_id, str(e))
         return {"error": str(e)}, 500
@@ -239,16 +319,11 @@ def leave_group_calendar(calendar_id: str, user_id: str) -> Tuple[dict, int]:
     """
     logger.info("User '%s' is attempting to leave group calendar '%s'", user_id, calendar_id)
 
-    # 1) Fetch calendar document
+    # 1) Fetch calendar document (point read)
     try:
-        cal_query = list(calendars_container.query_items(
-            query="SELECT * FROM Calendars c WHERE c.calendarId = @calId",
-            parameters=[{"name": "@calId", "value": calendar_id}],
-            enable_cross_partition_query=True
-        ))
-        if not cal_query:
-            return {"error": "Calendar not found."}, 404
-        cal_doc = cal_query[0]
+        cal_doc = database.calendars_container.read_item(item=calendar_id, partition_key=calendar_id)
+    except CosmosResourceNotFoundError:
+        return {"error": "Calendar not found."}, 404
     except CosmosHttpResponseError as e:
         logger.exception("Error fetching calendar '%s': %s", calendar_id, str(e))
         return {"error": str(e)}, 500
@@ -262,6 +337,7 @@ def leave_group_calendar(calendar_id: str, user_id: str) -> Tuple[dict, int]:
         return {"error": "User is not a member of this calendar."}, 400
 
     # 4) If the user is the owner, transfer ownership
+    patch_operations = []
     if cal_doc.get("ownerId") == user_id:
         # Check if there are other members to transfer ownership
         other_members = [m for m in cal_doc["members"] if m != user_id]
@@ -270,17 +346,28 @@ def leave_group_calendar(calendar_id: str, user_id: str) -> Tuple[dict, int]:
 
         # Assign the first member as the new owner
         new_owner_id = other_members[0]
-        cal_doc["ownerId"] = new_owner_id
-        logger.info("Transferred ownership to user '%s' for group calendar '%s'", new_owner_id, calendar_id)
+        patch_operations.append({"op": "set", "path": "/ownerId", "value": new_owner_id})
 
     # 5) Remove user from members list
-    cal_doc["members"].remove(user_id)
+    member_index = cal_doc["members"].index(user_id)
+    patch_operations.append({"op": "remove", "path": f"/members/{member_index}"})
 
-    # 6) Upsert the updated calendar
+    # 6) Patch the calendar; the ETag makes sure the member index is still the one we read
     try:
-        calendars_container.upsert_item(cal_doc)
+        database.calendars_container.patch_item(
+            item=calendar_id,
+            partition_key=calendar_id,
+            patch_operations=patch_operations,
+            etag=cal_doc["_etag"],
+            match_condition=MatchConditions.IfNotModified
+        )
+        invalidate_calendar(calendar_id)
+        if cal_doc.get("ownerId") == user_id:
+            logger.info("Transferred ownership to user '%s' for group calendar '%s'", new_owner_id, calendar_id)
         logger.info("User '%s' left group calendar '%s' successfully", user_id, calendar_id)
         return {"message": "You have left the group calendar successfully."}, 200
+    except CosmosAccessConditionFailedError:
+        return {"error": "Calendar was modified concurrently, please retry"}, 409
     except CosmosHttpResponseError as e:
         logger.exception("Error updating group calendar '%s' after user leave: %s", calendar_id, str(e))
         return {"error": str(e)}, 500
@@ -293,33 +380,21 @@ def get_all_events_for_user(user_id: str):
     """
     try:
         # 1. Get all calendars where the user is a member
-        query = "SELECT * FROM c WHERE ARRAY_CONTAINS(c.members, @userId)"
-        parameters = [{"name": "@userId", "value": user_id}]
-        calendars = list(calendars_container.query_items(
-            query=query,
-            parameters=parameters,
+        calendar_ids = list(database.calendars_container.query_items(
+            query=USER_CALENDAR_IDS_QUERY,
+            parameters=query_params(userId=user_id),
             enable_cross_partition_query=True
         ))
-        calendar_ids = [cal['calendarId'] for cal in calendars]
         
         if not calendar_ids:
             return []
         
-        # 2. Fetch all events from these calendars
-        # Cosmos DB SQL API doesn't support array parameters directly, so we'll construct a dynamic query
-        # For simplicity, we'll fetch events per calendar and aggregate them
-        all_events = []
-        for cal_id in calendar_ids:
-            event_query = "SELECT * FROM e WHERE e.calendarId = @calId"
-            event_params = [{"name": "@calId", "value": cal_id}]
-            events = list(events_container.query_items(
-                query=event_query,
-                parameters=event_params,
-                enable_cross_partition_query=True
-            ))
-            all_events.extend(events)
-        
-        return all_events
+        # 2. Fetch all events from these calendars in a single query
+        return list(database.events_container.query_items(
+            query=EVENTS_IN_CALENDARS_QUERY,
+            parameters=query_params(ids=calendar_ids),
+            enable_cross_partition_query=True
+        ))
     except CosmosHttpResponseError as e:
         logger.exception("Error fetching events for user '%s': %s", user_id, str(e))
         return []
@@ -331,26 +406,21 @@ def get_user_events(user_id: str) -> Tuple[List[dict], int]:
     """
     try:
         # Fetch all calendars where the user is a member (both personal and group)
-        calendars = list(calendars_container.query_items(
-            query="SELECT * FROM Calendars c WHERE ARRAY_CONTAINS(c.members, @userId)",
-            parameters=[{"name": "@userId", "value": user_id}],
+        calendar_ids = list(database.calendars_container.query_items(
+            query=USER_CALENDAR_IDS_QUERY,
+            parameters=query_params(userId=user_id),
             enable_cross_partition_query=True
         ))
-        if not calendars:
+        if not calendar_ids:
             logger.warning("User '%s' does not have any calendars.", user_id)
             return [], 404
 
-        calendar_ids = [cal["calendarId"] for cal in calendars]
-
-        # Fetch all events from these calendars
-        all_events = []
-        for cal_id in calendar_ids:
-            events = list(events_container.query_items(
-                query="SELECT * FROM Events e WHERE e.calendarId = @calId",
-                parameters=[{"name": "@calId", "value": cal_id}],
-                enable_cross_partition_query=True
-            ))
-            all_events.extend(events)
+        # Fetch all events from these calendars in a single query
+        all_events = list(database.events_container.query_items(
+            query=EVENTS_IN_CALENDARS_QUERY,
+            parameters=query_params(ids=calendar_ids),
+            enable_cross_partition_query=True
+        ))
 
         return all_events, 200
 
@@ -359,52 +429,153 @@ def get_user_events(user_id: str) -> Tuple[List[dict], int]:
         return [], 500
 
     
-def has_time_conflict(existing_events: list, new_start: datetime, new_end: datetime):
+def event_times(event: dict):
     """
-    Checks if the new event time overlaps with any existing events.
+    Returns an event's (startTime, endTime) as datetimes, or None if either is missing
+    or not a valid ISO string. Parsed values are cached per document version (_etag).
     """
-    for event in existing_events:
-        event_start = event.get("startTime")
-        event_end = event.get("endTime")
-        if not event_start or not event_end:
-            continue  # Skip events with invalid times
-
-        # Ensure datetime objects
+    cache_key = None
+    if "id" in event and "_etag" in event:
+        cache_key = event["id"] + event["_etag"]
+        with _event_times_lock:
+            times = _EVENT_TIMES.get(cache_key)
+        if times is not None:
+            return times
+
+    event_start = event.get("startTime")
+    event_end = event.get("endTime")
+    if not event_start or not event_end:
+        return None
+    try:
         if isinstance(event_start, str):
             event_start = datetime.fromisoformat(event_start)
         if isinstance(event_end, str):
             event_end = datetime.fromisoformat(event_end)
+    except ValueError:
+        return None
+
+    times = (event_start, event_end)
+    if cache_key is not None:
+        with _event_times_lock:
+            _EVENT_TIMES[cache_key] = times
+    return times
+
+
+def find_busy_members(members: List[str], new_start: datetime, new_end: datetime) -> List[dict]:
+    """
+    Finds the events of the given members that overlap [new_start, new_end).
+    Two queries in total: the members' calendars, then only the events of those calendars
+    that fall in the time window (the overlap is checked server-side on the ISO strings,
+    with a margin for differing UTC offsets, and confirmed exactly here).
+    Returns one {"username", "conflicting_event", "startTime", "endTime"} entry per busy
+    member and conflicting event. Raises CosmosHttpResponseError on DB errors.
+    """
+    calendars = list(database.calendars_container.query_items(
+        query=MEMBERS_CALENDARS_QUERY,
+        parameters=query_params(memberIds=list(members)),
+        enable_cross_partition_query=True
+    ))
+    if not calendars:
+        return []
+
+    window_start = (new_start - CONFLICT_WINDOW_MARGIN).replace(tzinfo=None).isoformat()
+    window_end = (new_end + CONFLICT_WINDOW_MARGIN).replace(tzinfo=None).isoformat()
+    candidates = database.events_container.query_items(
+        query=EVENTS_IN_WINDOW_QUERY,
+        parameters=query_params(
+            calIds=[cal["calendarId"] for cal in calendars],
+            windowStart=window_start,
+            windowEnd=window_end
+        ),
+        enable_cross_partition_query=True
+    )
+
+    conflicts_by_calendar = {}
+    for event in candidates:
+        times = event_times(event)
+        if times is None:
+            continue  # Skip missing or invalid times
+        event_start, event_end = times
 
         # Check for overlap
         latest_start = max(new_start, event_start)
         earliest_end = min(new_end, event_end)
-        delta = (earliest_end - latest_start).total_seconds()
-        if delta > 0:
-            return True  # Overlap found
-    return False  # No overlap
+        if (earliest_end - latest_start).total_seconds() > 0:
+            conflicts_by_calendar.setdefault(event["calendarId"], []).append((event, event_start, event_end))
 
+    if not conflicts_by_calendar:
+        return []
 
-def add_event(calendar_id: str, event_data: dict, user_id: str) -> Tuple[dict, int]:
-    logger.info("Adding event to calendar %s by user %s", calendar_id, user_id)
+    # Member sets of only the calendars that actually have conflicts
+    conflicting_calendars = [
+        (set(cal["members"]), conflicts_by_calendar[cal["calendarId"]])
+        for cal in calendars if cal["calendarId"] in conflicts_by_calendar
+    ]
+
+    busy = []
+    members = list(dict.fromkeys(members))
+    usernames = get_usernames(members)
+    for member_id in members:
+        for cal_members, conflicts in conflicting_calendars:
+            if member_id not in cal_members:
+                continue
+            for event, event_start, event_end in conflicts:
+                busy.append({
+                    "username": usernames.get(member_id, member_id),
+                    "conflicting_event": event.get("title", "Unnamed Event"),
+                    "startTime": event_start.isoformat(),
+                    "endTime": event_end.isoformat()
+                })
+    return busy
+
+
+def get_calendar(calendar_id: str) -> dict:
+    """
+    Returns a calendar document from the short-lived calendar cache, falling back to a
+    point read. The returned doc may be shared with other callers, so don't modify it.
+    Only for reads that don't authorise anything; membership checks read fresh.
+    Raises CosmosResourceNotFoundError / CosmosHttpResponseError on DB errors.
+    """
+    cal_doc = cached_calendar(calendar_id)
+    if cal_doc is None:
+        cal_doc = database.calendars_container.read_item(item=calendar_id, partition_key=calendar_id)
+        remember_calendar(cal_doc)
+    return cal_doc
 
-    # 1) Verify calendar
+
+def _get_calendar_for_member(calendar_id: str, user_id: str):
+    """
+    Reads a calendar and checks that user_id is one of its members.
+    Returns (cal_doc, 200) on success, (None, 404) if the calendar doesn't exist
+    and (None, 403) if it exists but the user isn't a member.
+    Raises CosmosHttpResponseError on DB errors.
+    """
+    # Authorise against a fresh read, not the per-worker cache: a member removed
+    # on another worker must lose access straight away
     try:
-        cal_query = list(calendars_container.query_items(
-            query="SELECT * FROM Calendars c WHERE c.calendarId = @calId",
-            parameters=[{"name": "@calId", "value": calendar_id}],
-            enable_cross_partition_query=True
-        ))
-        if not cal_query:
-            logger.warning("Calendar '%s' not found.", calendar_id)
-            return {"error": "Calendar not found"}, 404
+        cal_doc = database.calendars_container.read_item(item=calendar_id, partition_key=calendar_id)
+    except CosmosResourceNotFoundError:
+        return None, 404
+    remember_calendar(cal_doc)
+    if user_id not in cal_doc.get("members", []):
+        return None, 403
+    return cal_doc, 200
+
+
+def add_event(calendar_id: str, event_data: dict, user_id: str) -> Tuple[dict, int]:
+    logger.debug("Adding event to calendar %s by user %s", calendar_id, user_id)
 
-        cal_doc = cal_query[0]
+    # 1) Verify calendar and membership
+    try:
+        cal_doc, status = _get_calendar_for_member(calendar_id, user_id)
     except CosmosHttpResponseError as e:
         logger.exception("Error querying calendar '%s': %s", calendar_id, str(e))
         return {"error": str(e)}, 500
 
-    # 2) Check if user is a member of the calendar
-    if user_id not in cal_doc.get("members", []):
+    if status == 404:
+        logger.warning("Calendar '%s' not found.", calendar_id)
+        return {"error": "Calendar not found"}, 404
+    if status == 403:
         logger.warning("User '%s' is not a member of calendar '%s'", user_id, calendar_id)
         return {"error": "User is not a member of this calendar"}, 403
 
@@ -432,62 +603,18 @@ def add_event(calendar_id: str, event_data: dict, user_id: str) -> Tuple[dict, i
                 logger.warning("Invalid endTime format: %s", new_event_end)
                 return {"error": "Invalid endTime format."}, 400
 
-        busy_members_details = []
-
-        for member_id in members:
-            events, status = get_user_events(member_id)
-            if status != 200:
-                logger.error("Failed to fetch events for user '%s'", member_id)
-                return {"error": f"Failed to fetch events for user '{member_id}'"}, 500
-
-            for event in events:
-                event_start = event.get("startTime")
-                event_end = event.get("endTime")
-                if not event_start or not event_end:
-                    continue
-
-                # Convert to datetime if necessary
-                if isinstance(event_start, str):
-                    try:
-                        event_start = datetime.fromisoformat(event_start)
-                    except ValueError:
-                        continue  # Skip invalid formats
-                if isinstance(event_end, str):
-                    try:
-                        event_end = datetime.fromisoformat(event_end)
-                    except ValueError:
-                        continue  # Skip invalid formats
-
-                # Check for overlap
-                latest_start = max(new_event_start, event_start)
-                earliest_end = min(new_event_end, event_end)
-                delta = (earliest_end - latest_start).total_seconds()
-                if delta > 0:
-                    # Fetch username
-                    member_query = list(user_container.query_items(
-                        query="SELECT * FROM Users u WHERE u.userId = @userId",
-                        parameters=[{"name": "@userId", "value": member_id}],
-                        enable_cross_partition_query=True
-                    ))
-                    if member_query:
-                        username = member_query[0].get("username", member_id)
-                    else:
-                        username = member_id
-
-                    busy_members_details.append({
-                        "username": username,
-                        "conflicting_event": event.get("title", "Unnamed Event"),
-                        "startTime": event_start.isoformat(),
-                        "endTime": event_end.isoformat()
-                    })
+        try:
+            busy_members_details = find_busy_members(members, new_event_start, new_event_end)
+        except CosmosHttpResponseError as e:
+            logger.exception("Error checking conflicts for calendar '%s': %s", calendar_id, str(e))
+            return {"error": "Failed to check member availability"}, 500
 
         if busy_members_details:
-            error_message = "Cannot create event. The following user(s) are busy at the selected time:\n"
-            for member in busy_members_details:
-                error_message += (
-                    f"- {member['username']} during '{member['conflicting_event']}' "
-                    f"from {member['startTime']} to {member['endTime']}.\n"
-                )
+            error_message = "Cannot create event. The following user(s) are busy at the selected time:\n" + "".join(
+                f"- {member['username']} during '{member['conflicting_event']}' "
+                f"from {member['startTime']} to {member['endTime']}.\n"
+                for member in busy_members_details
+            )
             logger.info(error_message)
             return {"error": error_message}, 409  # 409 Conflict
 
@@ -499,35 +626,35 @@ def add_event(calendar_id: str, event_data: dict, user_id: str) -> Tuple[dict, i
 
     # 6) Create the event doc
     try:
-        new_event = Event(**event_data)  # Now calendarId and creatorId are included
+        new_event = Event.model_validate(event_data)  # Now calendarId and creatorId are included
 
-        # Serialize the Event object to JSON and then back to dict
-        event_json = new_event.json()
-        item_dict = json.loads(event_json)
+        # Dump straight to a JSON-compatible dict (datetimes -> ISO strings)
+        item_dict = new_event.model_dump(mode="json")
         item_dict["id"] = new_event.eventId  # Set 'id' for Cosmos
 
-        events_container.create_item(item_dict)
+        database.events_container.create_item(item_dict)
         logger.info("Event '%s' created in calendar '%s'", new_event.eventId, calendar_id)
 
-        # 7) ONLY after successful creation, send notifications if it's a group calendar
+        # 7) ONLY after successful creation, notify members in the background if it's a group calendar
         if cal_doc.get("isGroup"):
-            for member_id in cal_doc["members"]:
-                member_query = list(user_container.query_items(
-                    query="SELECT * FROM Users u WHERE u.userId = @userId",
-                    parameters=[{"name": "@userId", "value": member_id}],
-                    enable_cross_partition_query=True
-                ))
-                if member_query:
-                    member_doc = member_query[0]
-                    subject = f"New Event in Group Calendar '{cal_doc['name']}'"
-                    body_text = (
-                        f"Hello {member_doc['username']},\n\n"
-                        f"\nA new event '{new_event.title}' has been created in the group "
-                        f"calendar '{cal_doc['name']}'.\n"
-                        f"Start: {new_event.startTime}\n"
-                        f"End: {new_event.endTime}\n\n"
-                    )
-                    send_notification_email(member_doc.get("email"), subject, body_text)
+            member_ids = list(dict.fromkeys(cal_doc["members"]))
+
+            def notify_member(member_doc):
+                subject = f"New Event in Group Calendar '{cal_doc['name']}'"
+                body_text = (
+                    f"Hello {member_doc['username']},\n\n"
+                    f"\nA new event '{new_event.title}' has been created in the group "
+                    f"calendar '{cal_doc['name']}'.\n"
+                    f"Start: {new_event.startTime}\n"
+                    f"End: {new_event.endTime}\n\n"
+                )
+                send_notification_email(member_doc.get("email"), subject, body_text)
+
+            def notify_members():
+                # One lookup for all members, sends run concurrently
+                list(io_executor.map(notify_member, fetch_users_by_ids(member_ids)))
+
+            send_in_background(notify_members)
 
         return {"message": "Event created successfully", "eventId": new_event.eventId}, 201
 
@@ -546,37 +673,46 @@ def add_event(calendar_id: str, event_data: dict, user_id: str) -> Tuple[dict, i
 
 
 
-def get_events(calendar_id: str, user_id: str):
+def get_events(calendar_id: str, user_id: str, page_size: int = None, continuation_token: str = None):
     """
     Retrieve all events for the given calendar_id.
     Optionally, check if user_id is a member of this calendar.
+    If page_size is given, only one page is returned together with a continuationToken
+    the client can pass back to fetch the next page (None when there are no more pages).
     """
-    logger.info("Fetching events for calendar %s by user %s", calendar_id, user_id)
+    logger.debug("Fetching events for calendar %s by user %s", calendar_id, user_id)
     try:
-        # 1) Fetch the calendar doc
-        cal_query = list(calendars_container.query_items(
-            query="SELECT * FROM Calendars c WHERE c.calendarId = @calId",
-            parameters=[{"name": "@calId", "value": calendar_id}],
-            enable_cross_partition_query=True
-        ))
-        if not cal_query:
+        # 1) Fetch the calendar doc (and check membership if user_id is given)
+        if user_id:
+            cal_doc, status = _get_calendar_for_member(calendar_id, user_id)
+            if status == 403:
+                logger.warning("User '%s' is not a member of calendar '%s'", user_id, calendar_id)
+                return {"error": "User is not a member of this calendar"}, 403
+            if status == 404:
+                return {"error": "Calendar not found"}, 404
+        elif not exists(
+            database.calendars_container,
+            query=CALENDAR_EXISTS_QUERY,
+            parameters=query_params(calId=calendar_id),
+            partition_key=calendar_id
+        ):
             return {"error": "Calendar not found"}, 404
 
-        cal_doc = cal_query[0]
-
-        # 2) If you require user membership, check if user_id is in members
-        if user_id and user_id not in cal_doc.get("members", []):
-            logger.warning("User '%s' is not a member of calendar '%s'", user_id, calendar_id)
-            return {"error": "User is not a member of this calendar"}, 403
+        # 3) Query events by calendarId (single-partition; unpaged reads still
+        # come back from Cosmos in bounded pages of EVENTS_READ_PAGE_SIZE)
+        events_query = database.events_container.query_items(
+            query=CALENDAR_EVENTS_QUERY,
+            parameters=query_params(calId=calendar_id),
+            partition_key=calendar_id,
+            max_item_count=page_size or EVENTS_READ_PAGE_SIZE
+        )
 
-        # 3) Query events by calendarId
-        events_query = list(events_container.query_items(
-            query="SELECT * FROM Events e WHERE e.calendarId = @calId",
-            parameters=[{"name": "@calId", "value": calendar_id}],
-            enable_cross_partition_query=True
-        ))
+        if page_size:
+            pages = events_query.by_page(continuation_token)
+            events_page = list(next(pages, []))
+            return {"events": events_page, "continuationToken": pages.continuation_token}, 200
 
-        return {"events": events_query}, 200
+        return {"events": list(events_query)}, 200
 
     except CosmosHttpResponseError as e:
         logger.exception("Error fetching events for calendar '%s': %s", calendar_id, str(e))
@@ -591,20 +727,12 @@ def update_event(calendar_id: str, event_id: str, updated_data: dict, user_id: s
     logger.info("Updating event '%s' in calendar '%s' by user '%s'", event_id, calendar_id, user_id)
 
     try:
-        # Fetch the event document
-        event_query = list(events_container.query_items(
-            query="SELECT * FROM Events e WHERE e.eventId = @eventId AND e.calendarId = @calId",
-            parameters=[
-                {"name": "@eventId", "value": event_id},
-                {"name": "@calId", "value": calendar_id}
-            ],
-            enable_cross_partition_query=True
-        ))
-        if not event_query:
+        # Fetch the event document (point read: id is the eventId, calendarId the partition key)
+        try:
+            event_doc = database.events_container.read_item(item=event_id, partition_key=calendar_id)
+        except CosmosResourceNotFoundError:
             return {"error": "Event not found"}, 404
 
-        event_doc = event_query[0]
-
         # Check if the user is the creator
         if event_doc.get("creatorId") != user_id:
             logger.warning("User '%s' is not the creator of event '%s'", user_id, event_id)
@@ -620,12 +748,19 @@ def update_event(calendar_id: str, event_id: str, updated_data: dict, user_id: s
         if not updated:
             return {"error": "No valid fields to update"}, 400
 
-        # Upsert the updated event
-        events_container.upsert_item(event_doc)
+        # Write the event back, guarded by the ETag of the version we checked the creator on
+        database.events_container.replace_item(
+            item=event_doc["id"],
+            body=event_doc,
+            etag=event_doc["_etag"],
+            match_condition=MatchConditions.IfNotModified
+        )
         logger.info("Event '%s' updated successfully in calendar '%s'", event_id, calendar_id)
 
         return {"message": "Event updated successfully"}, 200
 
+    except CosmosAccessConditionFailedError:
+        return {"error": "Event was modified concurrently, please retry"}, 409
     except CosmosHttpResponseError as e:
         logger.exception("Error updating event '%s' in calendar '%s': %s", event_id, calendar_id, str(e))
         return {"error": str(e)}, 500
@@ -638,27 +773,19 @@ def delete_event(calendar_id: str, event_id: str, user_id: str) -> Tuple[dict, i
     logger.info("Deleting event '%s' from calendar '%s' by user '%s'", event_id, calendar_id, user_id)
 
     try:
-        # Fetch the event document
-        event_query = list(events_container.query_items(
-            query="SELECT * FROM Events e WHERE e.eventId = @eventId AND e.calendarId = @calId",
-            parameters=[
-                {"name": "@eventId", "value": event_id},
-                {"name": "@calId", "value": calendar_id}
-            ],
-            enable_cross_partition_query=True
-        ))
-        if not event_query:
+        # Fetch the event document (point read: id is the eventId, calendarId the partition key)
+        try:
+            event_doc = database.events_container.read_item(item=event_id, partition_key=calendar_id)
+        except CosmosResourceNotFoundError:
             return {"error": "Event not found"}, 404
 
-        event_doc = event_query[0]
-
         # Check if the user is the creator
         if event_doc.get("creatorId") != user_id:
             logger.warning("User '%s' is not the creator of event '%s'", user_id, event_id)
             return {"error": "Only the creator can delete this event"}, 403
 
         # Delete the event
-        events_container.delete_item(item=event_doc["id"], partition_key=calendar_id)
+        database.events_container.delete_item(item=event_id, partition_key=calendar_id)
         logger.info("Event '%s' deleted successfully from calendar '%s'", event_id, calendar_id)
 
         return {"message": "Event deleted successfully"}, 200
@@ -672,23 +799,85 @@ def delete_event(calendar_id: str, event_id: str, user_id: str) -> Tuple[dict, i
 # and managing group members
 def get_user_id(username: str):
     """
-    Retrieves the userId for a given username.
+    Retrieves the userId for a given username (cached for a few minutes).
     Returns None if the user does not exist.
     """
+    user_id = cached_user_id(username)
+    if user_id is not None:
+        return user_id
     try:
-        user_query = list(user_container.query_items(
-            query="SELECT * FROM Users u WHERE u.username = @username",
-            parameters=[{"name": "@username", "value": username}],
+        user_id = query_first(
+            database.user_container,
+            query=USER_ID_BY_USERNAME_QUERY,
+            parameters=query_params(username=username),
             enable_cross_partition_query=True
-        ))
-        if not user_query:
+        )
+        if user_id is None:
             return None
-        return user_query[0]["userId"]
+        remember_user(user_id, username)
+        return user_id
     except CosmosHttpResponseError as e:
         logger.exception("Error fetching user '%s': %s", username, str(e))
         return None
 
 
+def get_username(user_id: str):
+    """
+    Retrieves the username for a given userId (cached for a few minutes).
+    Returns None if the user does not exist.
+    """
+    username = cached_username(user_id)
+    if username is not None:
+        return username
+    try:
+        username = query_first(
+            database.user_container,
+            query=USERNAME_BY_ID_QUERY,
+            parameters=query_params(userId=user_id),
+            partition_key=user_id
+        )
+        if username is None:
+            return None
+        remember_user(user_id, username)
+        return username
+    except CosmosHttpResponseError as e:
+        logger.exception("Error fetching user '%s': %s", user_id, str(e))
+        return None
+
+
+def get_usernames(user_ids: Iterable[str]) -> dict:
+    """
+    Resolves several userIds to usernames, querying only the ones not cached.
+    Returns a {userId: username} dict; userIds that don't exist are simply absent.
+    Raises CosmosHttpResponseError on DB errors.
+    """
+    usernames = {}
+    missing = []
+    for user_id in user_ids:
+        username = cached_username(user_id)
+        if username is None:
+            missing.append(user_id)
+        else:
+            usernames[user_id] = username
+    for user in fetch_users_by_ids(missing):
+        remember_user(user["userId"], user["username"])
+        usernames[user["userId"]] = user["username"]
+    return usernames
+
+
+def fetch_users_by_ids(ids: List[str]) -> List[dict]:
+    """
+    Fetches userId, username and email for several users with a single query.
+    Unknown ids are simply missing from the result.
+    """
+    if not ids:
+        return []
+    return list(database.user_container.query_items(
+        query=USER_CONTACTS_QUERY,
+        parameters=query_params(ids=list(ids)),
+        enable_cross_partition_query=True
+    ))
+
 
 def create_group_calendar(owner_id: str, name: str, members_usernames: list, color: str):
     """
@@ -699,38 +888,46 @@ def create_group_calendar(owner_id: str, name: str, members_usernames: list, col
                 name, owner_id, color, members_usernames)
 
     # Allowed colors (unchanged from your snippet)
-    allowed_colors = [c.value for c in CalendarColor if c != CalendarColor.blue]
-    if color not in allowed_colors:
+    if color not in GROUP_COLORS:
         logger.warning("Invalid color '%s' for group calendar '%s'", color, name)
-        return {"error": f"Invalid color. Allowed colors are: {', '.join(allowed_colors)}"}, 400
+        return {"error": f"Invalid color. Allowed colors are: {GROUP_COLORS_TEXT}"}, 400
+
+    # Repeated usernames collapse to one member (order kept)
+    members_usernames = list(dict.fromkeys(members_usernames))
 
-    # 1. Validate that the owner exists
+    # 1. + 2. Validate that the owner exists and convert member usernames -> userIds,
+    # all with a single query (emails come along for the notifications below)
     try:
-        owner_query = list(user_container.query_items(
-            query="SELECT * FROM Users u WHERE u.userId = @userId",
-            parameters=[{"name": "@userId", "value": owner_id}],
+        users = list(database.user_container.query_items(
+            query=OWNER_AND_MEMBERS_QUERY,
+            parameters=query_params(
+                ownerId=owner_id,
+                usernames=members_usernames
+            ),
             enable_cross_partition_query=True
         ))
-        if not owner_query:
-            logger.warning("Owner with userId '%s' does not exist.", owner_id)
-            return {"error": "Owner does not exist"}, 404
     except CosmosHttpResponseError as e:
-        logger.exception("Error fetching owner '%s': %s", owner_id, str(e))
+        logger.exception("Error fetching owner '%s' and members %s: %s", owner_id, members_usernames, str(e))
         return {"error": str(e)}, 500
 
-    # 2. Convert member usernames -> userIds
-    member_ids = []
-    from app.calendar_routes import get_user_id  # If needed or from user_routes
-    for username in members_usernames:
-        user_id = get_user_id(username)
-        if not user_id:
-            logger.warning("Member username '%s' does not exist.", username)
-            return {"error": f"User '{username}' does not exist"}, 404
-        member_ids.append(user_id)
+    username_to_id = {}
+    users_by_id = {}
+    for user in users:
+        remember_user(user["userId"], user["username"])
+        username_to_id[user["username"]] = user["userId"]
+        users_by_id[user["userId"]] = user
+
+    if owner_id not in users_by_id:
+        logger.warning("Owner with userId '%s' does not exist.", owner_id)
+        return {"error": "Owner does not exist"}, 404
 
-    # 3. Include owner if not already
-    if owner_id not in member_ids:
-        member_ids.append(owner_id)
+    missing = [username for username in members_usernames if username not in username_to_id]
+    if missing:
+        logger.warning("Member usernames do not exist: %s", missing)
+        return {"error": f"User '{missing[0]}' does not exist"}, 404
+
+    # 3. Include owner if not already (dict keeps order and drops duplicates)
+    member_ids = list(dict.fromkeys([username_to_id[username] for username in members_usernames] + [owner_id]))
 
     # 4. Max 5 members
     if len(member_ids) > 5:
@@ -745,33 +942,35 @@ def create_group_calendar(owner_id: str, name: str, members_usernames: list, col
         members=member_ids,
         color=color
     )
-    cal_item = group_cal.dict()
+    cal_item = group_cal.model_dump()
     cal_item["id"] = group_cal.calendarId
 
     # 6. Save to Cosmos
     try:
-        calendars_container.create_item(cal_item)
+        database.calendars_container.create_item(cal_item)
         logger.info("Group calendar '%s' created with ID '%s' color '%s'",
                     name, group_cal.calendarId, color)
 
-        # 7. Email notifications (unchanged)
-        for mid in member_ids:
-            user_query = list(user_container.query_items(
-                query="SELECT * FROM Users u WHERE u.userId = @uid",
-                parameters=[{"name": "@uid", "value": mid}],
-                enable_cross_partition_query=True
-            ))
-            if user_query:
-                user_doc = user_query[0]
-                subject = "You've been added to a new group calendar!"
-                body_text = (
-                    f"Hello {user_doc['username']},\n\n"
-                    f"You have been added to the new group calendar '{name}'.\n"
-                    f"Calendar ID: {group_cal.calendarId}\n\n"
-                )
-                send_notification_email(user_doc.get("email"), subject, body_text)
+        # 7. Email notifications in the background, reusing the user docs fetched in step 1;
+        # all messages go out over one SMTP connection
+        def notify_members():
+            subject = "You've been added to a new group calendar!"
+            emails = []
+            for mid in member_ids:
+                user_doc = users_by_id.get(mid)
+                if user_doc:
+                    body_text = (
+                        f"Hello {user_doc['username']},\n\n"
+                        f"You have been added to the new group calendar '{name}'.\n"
+                        f"Calendar ID: {group_cal.calendarId}\n\n"
+                    )
+                    emails.append(build_notification_email(user_doc.get("email"), subject, body_text))
+            send_emails(emails)
+
+        send_in_background(notify_members)
 
-        # 8. Create a new chat channel (if chat_client is configured)
+        # 8. Create a new chat channel (if chat_client is configured) now that the
+        # calendar exists, so a failed write never leaves a channel behind
         if chat_client:
             try:
                 channel = chat_client.channel(
@@ -799,82 +998,170 @@ def create_group_calendar(owner_id: str, name: str, members_usernames: list, col
         return {"error": str(e)}, 500
 
 
-
-def add_user_to_group_calendar(calendar_id: str, admin_id: str, user_id: str):
-    """
-    Admin can add 'user_id' to the group calendar's members list.
-    Also add the user to the Stream Chat channel if chat_client is available.
+def update_calendar_doc(calendar_id: str, mutate):
     """
-    logger.info("Admin '%s' is adding user '%s' to group calendar '%s'",
-                admin_id, user_id, calendar_id)
+    Reads a calendar, lets mutate(cal_doc) change it in place and writes it back with
+    replace_item guarded by the document's ETag. If another writer got in first the
+    calendar is re-read and mutate is applied again, up to CALENDAR_WRITE_ATTEMPTS times.
 
-    # 1) Fetch the calendar doc
-    try:
-        cal_query = list(calendars_container.query_items(
-            query="SELECT * FROM Calendars c WHERE c.calendarId = @calId",
-            parameters=[{"name": "@calId", "value": calendar_id}],
-            enable_cross_partition_query=True
-        ))
-        if not cal_query:
-            return {"error": "Calendar not found"}, 404
-        cal_doc = cal_query[0]
-    except CosmosHttpResponseError as e:
-        logger.exception("Error fetching calendar '%s': %s", calendar_id, str(e))
-        return {"error": str(e)}, 500
+    mutate returns None to have the doc written, or a (dict, status) response to stop
+    without writing. Returns (cal_doc, None) after a write or (cal_doc, response) otherwise.
+    Raises CosmosResourceNotFoundError / CosmosHttpResponseError on DB errors.
+    """
+    for attempt in range(CALENDAR_WRITE_ATTEMPTS):
+        cal_doc = database.calendars_container.read_item(item=calendar_id, partition_key=calendar_id)
+        response = mutate(cal_doc)
+        if response is not None:
+            return cal_doc, response
+        try:
+            database.calendars_container.replace_item(
+                item=cal_doc["id"],
+                body=cal_doc,
+                etag=cal_doc["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+            invalidate_calendar(calendar_id)
+            return cal_doc, None
+        except CosmosAccessConditionFailedError:
+            if attempt == CALENDAR_WRITE_ATTEMPTS - 1:
+                raise
+            logger.info("Calendar '%s' was modified concurrently, retrying", calendar_id)
 
-    # 2) Must be group
-    if not cal_doc.get("isGroup"):
-        return {"error": "Cannot add user to a personal (non-group) calendar"}, 400
 
-    # 3) Admin check
-    if cal_doc.get("ownerId") != admin_id:
-        return {"error": "Only the calendar owner can add members"}, 403
+def patch_calendar_doc(calendar_id: str, plan):
+    """
+    Like update_calendar_doc, but sends only a list of patch operations instead of the
+    whole document. plan(cal_doc) returns the patch operations to apply, or a
+    (dict, status) response to stop without writing. The patch is guarded by the ETag
+    of the doc the operations were planned against (array indexes stay valid), and is
+    re-planned on a fresh read up to CALENDAR_WRITE_ATTEMPTS times.
+
+    Returns (patched_doc, None) after a write or (cal_doc, response) otherwise.
+    Raises CosmosResourceNotFoundError / CosmosHttpResponseError on DB errors.
+    """
+    for attempt in range(CALENDAR_WRITE_ATTEMPTS):
+        cal_doc = database.calendars_container.read_item(item=calendar_id, partition_key=calendar_id)
+        plan_result = plan(cal_doc)
+        if isinstance(plan_result, tuple):
+            return cal_doc, plan_result
+        try:
+            patched_doc = database.calendars_container.patch_item(
+                item=calendar_id,
+                partition_key=calendar_id,
+                patch_operations=plan_result,
+                etag=cal_doc["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+            invalidate_calendar(calendar_id)
+            return patched_doc, None
+        except CosmosAccessConditionFailedError:
+            if attempt == CALENDAR_WRITE_ATTEMPTS - 1:
+                raise
+            logger.info("Calendar '%s' was modified concurrently, retrying", calendar_id)
+
+
+# Wording of the owner-only member changes handled by _admin_member_op
+MEMBER_OP_TEXT = {
+    "add": {
+        "not_group": "Cannot add user to a personal (non-group) calendar",
+        "not_owner": "Only the calendar owner can add members",
+        "subject": "You've been added to a group calendar!",
+        "change": "added to",
+        "by": "Added by",
+        "success": "User added to group calendar successfully",
+    },
+    "remove": {
+        "not_group": "Cannot remove user from a personal (non-group) calendar",
+        "not_owner": "Only the calendar owner can remove members",
+        "subject": "You've been removed from a group calendar",
+        "change": "removed from",
+        "by": "Removed by",
+        "success": "User removed successfully",
+    },
+}
+
+
+def _admin_member_op(calendar_id: str, admin_id: str, user_id: str, op: str, plan, chat_op):
+    """
+    Shared flow of the owner-only member changes ("add" / "remove"):
+    checks that the calendar is a group owned by admin_id, patches it with the operations
+    plan(cal_doc) returns (plan may return a response instead to stop), emails user_id in
+    the background and applies chat_op(channel) to the Stream Chat channel.
+    """
+    text = MEMBER_OP_TEXT[op]
 
-    # 4) Add user if not already
-    if user_id in cal_doc["members"]:
-        logger.info("User '%s' is already in the members list", user_id)
-        return {"message": "User already in group calendar"}, 200
-    else:
-        cal_doc["members"].append(user_id)
+    def guarded_plan(cal_doc):
+        if not cal_doc.get("isGroup"):
+            return {"error": text["not_group"]}, 400
+        if cal_doc.get("ownerId") != admin_id:
+            return {"error": text["not_owner"]}, 403
+        return plan(cal_doc)
 
-    # 5) Upsert doc
     try:
-        calendars_container.upsert_item(cal_doc)
-        logger.info("User '%s' added to group calendar '%s'", user_id, calendar_id)
-
-        # 5a) Send email
-        user_query = list(user_container.query_items(
-            query="SELECT * FROM Users u WHERE u.userId = @userId",
-            parameters=[{"name": "@userId", "value": user_id}],
-            enable_cross_partition_query=True
-        ))
-        if user_query:
-            new_user_doc = user_query[0]
-            subject = "You've been added to a group calendar!"
-            body_text = (
-                f"Hello {new_user_doc['username']},\n\n"
-                f"You have been added to the group calendar '{cal_doc['name']}'.\n"
-                f"Calendar ID: {cal_doc['calendarId']}\n"
-                f"Added by Admin ID: {admin_id}\n\n"
+        # Fetch the calendar doc and patch it, guarded by its ETag
+        cal_doc, response = patch_calendar_doc(calendar_id, guarded_plan)
+        if response is not None:
+            return response
+        logger.info("User '%s' %s group calendar '%s'", user_id, text["change"], calendar_id)
+
+        # Email in the background
+        def notify_user():
+            user_doc = query_first(
+                database.user_container,
+                query=USER_CONTACT_QUERY,
+                parameters=query_params(userId=user_id),
+                partition_key=user_id
             )
-            send_notification_email(new_user_doc.get("email"), subject, body_text)
+            if user_doc:
+                body_text = (
+                    f"Hello {user_doc['username']},\n\n"
+                    f"You have been {text['change']} the group calendar '{cal_doc['name']}'.\n"
+                    f"Calendar ID: {cal_doc['calendarId']}\n"
+                    f"{text['by']} Admin ID: {admin_id}\n\n"
+                )
+                send_notification_email(user_doc.get("email"), text["subject"], body_text)
 
-        # 5b) If chat_client and it's group => add them to the channel
+        send_in_background(notify_user)
+
+        # Mirror the change in the chat channel (if chat_client is configured)
         if chat_client and cal_doc.get("isGroup"):
             try:
-                channel = chat_client.channel("team", calendar_id)
-                channel.add_members([user_id])
-                logger.info("Added user '%s' to Stream Chat channel '%s'", user_id, calendar_id)
+                chat_op(chat_client.channel("team", calendar_id))
+                logger.info("User '%s' %s Stream Chat channel '%s'", user_id, text["change"], calendar_id)
             except Exception as e:
-                logger.exception("Error adding user '%s' to Stream Chat channel: %s", user_id, e)
+                logger.exception("Error updating Stream Chat channel '%s' for user '%s': %s",
+                                 calendar_id, user_id, e)
 
-        return {"message": "User added to group calendar successfully"}, 200
+        return {"message": text["success"]}, 200
 
+    except CosmosResourceNotFoundError:
+        return {"error": "Calendar not found"}, 404
+    except CosmosAccessConditionFailedError:
+        return {"error": "Calendar was modified concurrently, please retry"}, 409
     except CosmosHttpResponseError as e:
-        logger.exception("Error updating group calendar '%s': %s", calendar_id, str(e))
+        logger.exception("Error updating members of group calendar '%s': %s", calendar_id, str(e))
         return {"error": str(e)}, 500
 
 
+def add_user_to_group_calendar(calendar_id: str, admin_id: str, user_id: str):
+    """
+    Admin can add 'user_id' to the group calendar's members list.
+    Also add the user to the Stream Chat channel if chat_client is available.
+    """
+    logger.info("Admin '%s' is adding user '%s' to group calendar '%s'",
+                admin_id, user_id, calendar_id)
+
+    def add_member(cal_doc):
+        # Add user if not already: append just the new id to the members array
+        if user_id in cal_doc["members"]:
+            logger.info("User '%s' is already in the members list", user_id)
+            return {"message": "User already in group calendar"}, 200
+        return [{"op": "add", "path": "/members/-", "value": user_id}]
+
+    return _admin_member_op(calendar_id, admin_id, user_id, "add", add_member,
+                            lambda channel: channel.add_members([user_id]))
+
+
 def remove_user_from_group_calendar(calendar_id: str, admin_id: str, user_id: str):
     """
     Admin can remove 'user_id' from the group calendar's members list.
@@ -883,110 +1170,110 @@ def remove_user_from_group_calendar(calendar_id: str, admin_id: str, user_id: st
     logger.info("Admin '%s' removing user '%s' from group calendar '%s'",
                 admin_id, user_id, calendar_id)
 
-    # 1) Fetch the calendar doc
-    try:
-        cal_query = list(calendars_container.query_items(
-            query="SELECT * FROM Calendars c WHERE c.calendarId = @calId",
-            parameters=[{"name": "@calId", "value": calendar_id}],
-            enable_cross_partition_query=True
-        ))
-        if not cal_query:
-            return {"error": "Calendar not found"}, 404
-        cal_doc = cal_query[0]
-    except CosmosHttpResponseError as e:
-        logger.exception("Error fetching calendar '%s': %s", calendar_id, str(e))
-        return {"error": str(e)}, 500
+    def remove_member(cal_doc):
+        if user_id not in cal_doc["members"]:
+            logger.info("User '%s' is not in this group calendar", user_id)
+            return {"message": "User not in group calendar"}, 200
+        # The ETag guarantees the index still points at this user when the patch lands
+        return [{"op": "remove", "path": f"/members/{cal_doc['members'].index(user_id)}"}]
 
-    if not cal_doc.get("isGroup"):
-        return {"error": "Cannot remove user from a personal (non-group) calendar"}, 400
-
-    if cal_doc.get("ownerId") != admin_id:
-        return {"error": "Only the calendar owner can remove members"}, 403
+    return _admin_member_op(calendar_id, admin_id, user_id, "remove", remove_member,
+                            lambda channel: channel.remove_members([user_id]))
 
-    if user_id not in cal_doc["members"]:
-        logger.info("User '%s' is not in this group calendar", user_id)
-        return {"message": "User not in group calendar"}, 200
-    else:
-        cal_doc["members"].remove(user_id)
 
-    # Upsert doc
-    try:
-        calendars_container.upsert_item(cal_doc)
-        logger.info("User '%s' removed from group calendar '%s'", user_id, calendar_id)
-
-        # Email
-        removed_user_query = list(user_container.query_items(
-            query="SELECT * FROM Users u WHERE u.userId = @userId",
-            parameters=[{"name": "@userId", "value": user_id}],
-            enable_cross_partition_query=True
-        ))
-        if removed_user_query:
-            removed_user_doc = removed_user_query[0]
-            subject = "You've been removed from a group calendar"
-            body_text = (
-                f"Hello {removed_user_doc['username']},\n\n"
-                f"You have been removed from the group calendar '{cal_doc['name']}'.\n"
-                f"Calendar ID: {cal_doc['calendarId']}\n"
-                f"Removed by Admin ID: {admin_id}\n\n"
+def delete_calendar_events(calendar_id: str) -> int:
+    """
+    Deletes all events of a calendar server-side with the bulkDeleteByCalendar stored procedure,
+    calling it again until it reports no continuation. Returns the number of deleted events.
+    The procedure is registered once if it's missing; if it still can't be found, or can't
+    run at all, the remaining events are deleted from here instead.
+    """
+    deleted = 0
+    registered = False
+    while True:
+        try:
+            result = database.events_container.scripts.execute_stored_procedure(
+                sproc=BULK_DELETE_SPROC_ID,
+                partition_key=calendar_id,
+                params=[calendar_id]
             )
-            send_notification_email(removed_user_doc.get("email"), subject, body_text)
+        except CosmosResourceNotFoundError as e:
+            if registered:
+                logger.warning("Stored procedure still missing for calendar '%s', deleting events directly: %s",
+                               calendar_id, str(e))
+                return deleted + _delete_calendar_events_directly(calendar_id)
+            ensure_stored_procedures(database.events_container)
+            registered = True
+            continue
+        except CosmosHttpResponseError as e:
+            logger.warning("Stored procedure delete failed for calendar '%s', deleting events directly: %s",
+                           calendar_id, str(e))
+            return deleted + _delete_calendar_events_directly(calendar_id)
+        deleted += result["deleted"]
+        if not result["continuation"]:
+            return deleted
 
-        # Also remove them from the chat channel
-        if chat_client and cal_doc.get("isGroup"):
-            try:
-                channel = chat_client.channel("team", calendar_id)
-                channel.remove_members([user_id])
-                logger.info("Removed user '%s' from Stream Chat channel '%s'", user_id, calendar_id)
-            except Exception as e:
-                logger.exception("Error removing user '%s' from Chat channel: %s", user_id, e)
 
-        return {"message": "User removed successfully"}, 200
+def _delete_calendar_events_directly(calendar_id: str) -> int:
+    """
+    Fallback for delete_calendar_events: fetches only the event ids from the calendar's
+    partition and deletes them in transactional batches of EVENT_BATCH_SIZE
+    (all events share the calendarId partition key, so they are batch-eligible).
+    Ids are read a page at a time and each page is deleted as soon as it arrives.
+    """
+    pages = database.events_container.query_items(
+        query=CALENDAR_EVENT_IDS_QUERY,
+        parameters=query_params(calId=calendar_id),
+        partition_key=calendar_id,
+        max_item_count=EVENT_BATCH_SIZE
+    ).by_page()
+
+    deleted = 0
+    for page in pages:
+        batch = [("delete", (event_id,)) for event_id in page]
+        if batch:
+            database.events_container.execute_item_batch(batch_operations=batch, partition_key=calendar_id)
+            deleted += len(batch)
+    return deleted
+
 
-    except CosmosHttpResponseError as e:
-        logger.exception("Error removing user from group calendar '%s': %s", calendar_id, str(e))
-        return {"error": str(e)}, 500
-    
 def delete_group_calendar(calendar_id: str, admin_id: str) -> Tuple[dict, int]:
     """
     Deletes a group calendar. Only the owner (admin) can perform this action.
-    Deletes all associated events before deleting the calendar.
+    Deletes all associated events before deleting the calendar, then removes the
+    admin from its Stream Chat channel in the background.
     """
     logger.info("Admin '%s' is attempting to delete group calendar '%s'", admin_id, calendar_id)
 
     try:
-        # 1. Fetch the calendar document
-        cal_query = list(calendars_container.query_items(
-            query="SELECT * FROM Calendars c WHERE c.calendarId = @calId",
-            parameters=[{"name": "@calId", "value": calendar_id}],
-            enable_cross_partition_query=True
-        ))
-        if not cal_query:
+        # 1. Fetch the calendar document with a fresh point read: ownership may have been
+        #    transferred on another worker, so the cached doc isn't trusted for a delete
+        try:
+            cal_doc = database.calendars_container.read_item(item=calendar_id, partition_key=calendar_id)
+        except CosmosResourceNotFoundError:
             return {"error": "Group calendar not found."}, 404
 
-        cal_doc = cal_query[0]
-
-        # 2. Verify ownership
+        # 2. Verify it's a group calendar owned by the admin
+        if not cal_doc.get("isGroup"):
+            return {"error": "Cannot delete a personal calendar as a group calendar."}, 400
         if cal_doc.get("ownerId") != admin_id:
             return {"error": "Only the calendar owner can delete the group calendar."}, 403
 
         # 3. Delete all associated events
         try:
-            events_query = list(events_container.query_items(
-                query="SELECT * FROM Events e WHERE e.calendarId = @calId",
-                parameters=[{"name": "@calId", "value": calendar_id}],
-                enable_cross_partition_query=True
-            ))
-            for event in events_query:
-                events_container.delete_item(item=event["id"], partition_key=calendar_id)
-            logger.info("All events associated with group calendar '%s' have been deleted.", calendar_id)
+            deleted = delete_calendar_events(calendar_id)
+            logger.info("All %d events associated with group calendar '%s' have been deleted.", deleted, calendar_id)
         except CosmosHttpResponseError as e:
             logger.exception("Error deleting events for group calendar '%s': %s", calendar_id, str(e))
             return {"error": str(e)}, 500
 
         # 4. Delete the calendar
         try:
-            calendars_container.delete_item(item=cal_doc["id"], partition_key=calendar_id)
+            database.calendars_container.delete_item(item=cal_doc["id"], partition_key=calendar_id)
+            invalidate_calendar(calendar_id)
             logger.info("Group calendar '%s' deleted successfully.", calendar_id)
+            if chat_client:
+                send_in_background(lambda: chat_client.channel("team", calendar_id).remove_members([admin_id]))
             return {"message": "Group calendar deleted successfully."}, 200
         except CosmosHttpResponseError as e:
             logger.exception("Error deleting group calendar '%s': %s", calendar_id, str(e))
@@ -1006,12 +1293,12 @@ def import_internet_calendar(user_id: str, ical_url: str, name: str, color: str)
 
     # 1. Validate the user exists
     try:
-        user_query = list(user_container.query_items(
-            query="SELECT * FROM Users u WHERE u.userId = @userId",
-            parameters=[{"name": "@userId", "value": user_id}],
-            enable_cross_partition_query=True
-        ))
-        if not user_query:
+        if not exists(
+            database.user_container,
+            query=USER_EXISTS_QUERY,
+            parameters=query_params(userId=user_id),
+            partition_key=user_id
+        ):
             logger.warning("User '%s' does not exist.", user_id)
             return {"error": "User does not exist."}, 404
     except CosmosHttpResponseError as e:
@@ -1020,12 +1307,22 @@ def import_internet_calendar(user_id: str, ical_url: str, name: str, color: str)
 
     # 2. Fetch the iCal data from the URL
     try:
-        response = requests.get(ical_url)
-        if response.status_code != 200:
-            logger.warning("Failed to fetch iCal data. Status code: %s", response.status_code)
-            return {"error": "Failed to fetch iCal data from the provided URL."}, 400
-
-        ical_data = response.content
+        with ical_session.get(ical_url, stream=True, timeout=ICAL_TIMEOUT) as response:
+            if response.status_code != 200:
+                logger.warning("Failed to fetch iCal data. Status code: %s", response.status_code)
+                return {"error": "Failed to fetch iCal data from the provided URL."}, 400
+
+            # Read in chunks so an oversized feed is rejected without buffering all of it
+            chunks = []
+            received = 0
+            for chunk in response.iter_content(chunk_size=ICAL_CHUNK_SIZE):
+                received += len(chunk)
+                if received > ICAL_MAX_BYTES:
+                    logger.warning("iCal data from '%s' exceeds %d bytes", ical_url, ICAL_MAX_BYTES)
+                    return {"error": "iCal data is too large."}, 413
+                chunks.append(chunk)
+
+        ical_data = b"".join(chunks)
         ical_calendar = ICalCalendar.from_ical(ical_data)
     except Exception as e:
         logger.exception("Error fetching or parsing iCal data: %s", str(e))
@@ -1049,34 +1346,67 @@ def import_internet_calendar(user_id: str, ical_url: str, name: str, color: str)
 
     # 5. Iterate through each event in the iCal data and add to the new calendar
     imported_events = []
+    pending_events = []
     try:
-        for component in ical_calendar.walk():
-            if component.name == "VEVENT":
-                event_title = str(component.get('SUMMARY', 'No Title'))
-                event_description = str(component.get('DESCRIPTION', ''))
-                event_start = component.get('DTSTART').dt
-                event_end = component.get('DTEND').dt
-
-                # Ensure datetime objects
-                if isinstance(event_start, datetime) and isinstance(event_end, datetime):
-                    # Create Event model instance
-                    new_event = Event(
-                        calendarId=new_calendar_id,
-                        title=event_title,
-                        description=event_description,
-                        startTime=event_start,
-                        endTime=event_end,
-                        creatorId=user_id
-                    )
-
-                    # Serialize to JSON and back to dict for Cosmos DB
-                    event_json = new_event.json()
-                    event_dict = json.loads(event_json)
-                    event_dict["id"] = new_event.eventId  # Cosmos 'id' field
+        # Local bindings keep attribute lookups out of the per-event loop
+        add_pending = pending_events.append
+        add_imported = imported_events.append
+
+        # walk("VEVENT") filters components for us
+        for component in ical_calendar.walk("VEVENT"):
+            get = component.get
+            event_start = get('DTSTART').dt
+            event_end = get('DTEND').dt
+
+            # Ensure datetime objects (all-day events come through as dates)
+            if not (isinstance(event_start, datetime) and isinstance(event_end, datetime)):
+                continue
+
+            # Create Event model instance
+            new_event = Event(
+                calendarId=new_calendar_id,
+                title=str(get('SUMMARY', 'No Title')),
+                description=str(get('DESCRIPTION', '')),
+                startTime=event_start,
+                endTime=event_end,
+                creatorId=user_id
+            )
 
-                    # Insert the event into Cosmos DB
-                    events_container.create_item(event_dict)
-                    imported_events.append(new_event.eventId)
+            # Dump straight to a JSON-compatible dict for Cosmos DB (datetimes -> ISO strings)
+            event_dict = new_event.model_dump(mode="json")
+            event_dict["id"] = new_event.eventId  # Cosmos 'id' field
+
+            add_pending(event_dict)
+            add_imported(new_event.eventId)
+
+        # All events share the new calendar's partition key, so insert them
+        # with transactional batches instead of one call each. The batch size
+        # adapts to how long the previous batch took: it doubles (up to 100)
+        # while batches finish quickly and halves when one is slow/throttled.
+        # A batch over the 2 MB request limit (long descriptions) is halved and retried.
+        total = len(pending_events)
+        batch_size = IMPORT_INITIAL_BATCH_SIZE
+        written = 0
+        while written < total:
+            batch = [("create", (event_dict,)) for event_dict in pending_events[written:written + batch_size]]
+            started = time.monotonic()
+            try:
+                database.events_container.execute_item_batch(batch_operations=batch, partition_key=new_calendar_id)
+            except CosmosHttpResponseError as e:
+                if e.status_code != 413 or len(batch) == 1:
+                    raise
+                batch_size = max(len(batch) // 2, 1)
+                logger.info("Batch of %d events too large for calendar '%s', retrying with %d",
+                            len(batch), new_calendar_id, batch_size)
+                continue
+            elapsed = time.monotonic() - started
+            written += len(batch)
+            logger.info("Imported %d/%d events into calendar '%s'", written, total, new_calendar_id)
+
+            if elapsed < IMPORT_FAST_BATCH_SECONDS:
+                batch_size = min(batch_size * 2, EVENT_BATCH_SIZE)
+            else:
+                batch_size = max(batch_size // 2, 1)
 
         logger.info("Imported %d events into calendar '%s'", len(imported_events), new_calendar_id)
         return {
@@ -1087,16 +1417,34 @@ def import_internet_calendar(user_id: str, ical_url: str, name: str, color: str)
 
     except ValidationError as ve:
         logger.warning("Validation error while importing events: %s", str(ve))
+        _discard_imported_calendar(new_calendar_id)
         return {"error": f"Validation error: {str(ve)}"}, 422
 
     except CosmosHttpResponseError as ce:
         logger.exception("Cosmos DB error while importing events: %s", str(ce))
+        _discard_imported_calendar(new_calendar_id)
         return {"error": str(ce)}, 500
 
     except Exception as e:
         logger.exception("Unexpected error while importing calendar events: %s", str(e))
+        _discard_imported_calendar(new_calendar_id)
         return {"error": "Failed to import calendar events."}, 500
 
+
+def _discard_imported_calendar(calendar_id: str):
+    """
+    Removes a calendar whose import failed part-way, together with the events already
+    written to it, so a failed import doesn't leave a half-filled calendar behind.
+    Best effort: a cleanup failure is logged and the import error is still returned.
+    """
+    try:
+        delete_calendar_events(calendar_id)
+        database.calendars_container.delete_item(item=calendar_id, partition_key=calendar_id)
+        invalidate_calendar(calendar_id)
+        logger.info("Discarded partially imported calendar '%s'", calendar_id)
+    except CosmosHttpResponseError as e:
+        logger.exception("Error discarding partially imported calendar '%s': %s", calendar_id, str(e))
+
     
 def edit_personal_calendar(calendar_id: str, user_id: str, updated_data: dict) -> Tuple[dict, int]:
     """
@@ -1105,52 +1453,48 @@ def edit_personal_calendar(calendar_id: str, user_id: str, updated_data: dict) -
     """
     logger.info("User '%s' is editing personal calendar '%s'", user_id, calendar_id)
     
-    try:
-        # Fetch the calendar document
-        cal_query = list(calendars_container.query_items(
-            query="SELECT * FROM Calendars c WHERE c.calendarId = @calId",
-            parameters=[{"name": "@calId", "value": calendar_id}],
-            enable_cross_partition_query=True
-        ))
-        if not cal_query:
-            return {"error": "Calendar not found"}, 404
-        cal_doc = cal_query[0]
-        
+    def apply_edit(cal_doc):
         # Check if it's a personal calendar
         if cal_doc.get("isGroup"):
             return {"error": "Only personal calendars can be edited with this endpoint"}, 400
-        
+
         # Check if the user is the owner
         if cal_doc.get("ownerId") != user_id:
             return {"error": "Only the calendar owner can edit this calendar"}, 403
-        
+
         # Update name and/or color
         updated = False
-        allowed_colors = [color.value for color in CalendarColor]
-        
+
         if "name" in updated_data:
             new_name = updated_data["name"].strip()
             if not new_name:
                 return {"error": "Calendar name cannot be empty"}, 400
             cal_doc["name"] = new_name
             updated = True
-        
+
         if "color" in updated_data:
             new_color = updated_data["color"]
-            if new_color not in allowed_colors:
+            if new_color not in PERSONAL_COLORS:
                 logger.warning("Invalid color '%s' for calendar '%s'", new_color, calendar_id)
-                return {"error": f"Invalid color. Allowed colors are: {', '.join(allowed_colors)}"}, 400
+                return {"error": f"Invalid color. Allowed colors are: {PERSONAL_COLORS_TEXT}"}, 400
             cal_doc["color"] = new_color
             updated = True
-        
+
         if not updated:
             return {"error": "No valid fields to update"}, 400
-        
-        # Upsert the updated calendar
-        calendars_container.upsert_item(cal_doc)
+
+    try:
+        # Fetch the calendar document and replace it guarded by its ETag
+        _, response = update_calendar_doc(calendar_id, apply_edit)
+        if response is not None:
+            return response
         logger.info("Personal calendar '%s' updated successfully", calendar_id)
         return {"message": "Personal calendar updated successfully"}, 200
-        
+
+    except CosmosResourceNotFoundError:
+        return {"error": "Calendar not found"}, 404
+    except CosmosAccessConditionFailedError:
+        return {"error": "Calendar was modified concurrently, please retry"}, 409
     except CosmosHttpResponseError as e:
         logger.exception("Error updating personal calendar '%s': %s", calendar_id, str(e))
         return {"error": str(e)}, 500
@@ -1,6 +1,10 @@
 # app/database.py
 
 import os
+from functools import lru_cache
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
 from azure.cosmos import CosmosClient
 from dotenv import load_dotenv
 
@@ -8,15 +12,107 @@ from dotenv import load_dotenv
 load_dotenv()
 
 COSMOS_CONNECTION_STRING = os.getenv("COSMOS_CONNECTION_STRING")
+# Optional comma-separated list of regions to route requests to, nearest first
+COSMOS_PREFERRED_REGIONS = [
+    region.strip() for region in os.getenv("COSMOS_PREFERRED_REGIONS", "").split(",") if region.strip()
+]
+# Seconds to wait for a connection to the Cosmos endpoint
+COSMOS_CONNECTION_TIMEOUT = int(os.getenv("COSMOS_CONNECTION_TIMEOUT", "5"))
+# Bounded retries so a throttled burst fails fast instead of holding the invocation
+COSMOS_RETRY_TOTAL = int(os.getenv("COSMOS_RETRY_TOTAL", "3"))
+COSMOS_RETRY_BACKOFF_MAX = int(os.getenv("COSMOS_RETRY_BACKOFF_MAX", "10"))
+# Keep-alive connections kept open to the Cosmos endpoint per worker
+COSMOS_POOL_SIZE = int(os.getenv("COSMOS_POOL_SIZE", "64"))
 
 DATABASE_NAME = "CalendarDB"
 USERS_CONTAINER = "Users"
 CALENDARS_CONTAINER = "Calendars"
 EVENTS_CONTAINER = "Events"
 
-client = CosmosClient.from_connection_string(COSMOS_CONNECTION_STRING)
-database = client.get_database_client(DATABASE_NAME)
 
-user_container = database.get_container_client(USERS_CONTAINER)
-calendars_container = database.get_container_client(CALENDARS_CONTAINER)
-events_container = database.get_container_client(EVENTS_CONTAINER)
+@lru_cache(maxsize=1)
+def get_cosmos_client() -> CosmosClient:
+    """
+    Returns the process-wide CosmosClient. Built once per worker so endpoint
+    discovery and the connection pool are shared by every invocation.
+    The Python SDK only talks Gateway (HTTPS) mode, so latency under spiky
+    Functions load is bounded through timeouts and retry limits instead.
+    Requests go through a pooled requests.Session so TLS connections are kept
+    alive and reused across invocations.
+    """
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=COSMOS_POOL_SIZE, pool_maxsize=COSMOS_POOL_SIZE))
+    return CosmosClient.from_connection_string(
+        COSMOS_CONNECTION_STRING,
+        transport=RequestsTransport(session=session, session_owner=False),
+        preferred_locations=COSMOS_PREFERRED_REGIONS or None,
+        connection_timeout=COSMOS_CONNECTION_TIMEOUT,
+        retry_total=COSMOS_RETRY_TOTAL,
+        retry_backoff_max=COSMOS_RETRY_BACKOFF_MAX
+    )
+
+
+def get_database():
+    """
+    Returns the client for the app's database (no I/O, built on the shared client).
+    """
+    return get_cosmos_client().get_database_client(DATABASE_NAME)
+
+
+@lru_cache(maxsize=None)
+def get_container(name: str):
+    """
+    Returns the container client for one of the app's containers, built once per worker.
+    """
+    return get_database().get_container_client(name)
+
+
+# `client`, `database` and the container globals are resolved on first access
+# (module __getattr__), so importing this module doesn't connect to Cosmos.
+_LAZY_ATTRIBUTES = {
+    "client": get_cosmos_client,
+    "database": get_database,
+    "user_container": lambda: get_container(USERS_CONTAINER),
+    "calendars_container": lambda: get_container(CALENDARS_CONTAINER),
+    "events_container": lambda: get_container(EVENTS_CONTAINER),
+}
+
+
+def __getattr__(name: str):
+    factory = _LAZY_ATTRIBUTES.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return factory()
+
+
+def query_first(container, query: str, parameters: list, **kwargs):
+    """
+    Returns the first document matching a query, or None. The server is asked for
+    one-item pages and only the first one is read, so no result list is built.
+    """
+    return next(iter(container.query_items(
+        query=query,
+        parameters=parameters,
+        max_item_count=1,
+        **kwargs
+    )), None)
+
+
+def query_params(**values) -> list:
+    """
+    Builds a Cosmos parameter list from keyword arguments:
+    query_params(calId=x) -> [{"name": "@calId", "value": x}]
+    """
+    return [{"name": f"@{name}", "value": value} for name, value in values.items()]
+
+
+def exists(container, query: str, parameters: list, **kwargs) -> bool:
+    """
+    Runs a `SELECT VALUE COUNT(1)` query and reports whether anything matched.
+    Only the count comes back, so existence checks never pull the documents.
+    """
+    return next(iter(container.query_items(
+        query=query,
+        parameters=parameters,
+        **kwargs
+    )), 0) > 0
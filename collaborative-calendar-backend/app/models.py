@@ -1,6 +1,6 @@
 # app/models.py
 
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, ConfigDict, Field, EmailStr, field_serializer
 from typing import List, Optional
 import uuid
 from datetime import datetime
@@ -10,17 +10,16 @@ from enum import Enum  # Import Enum
 # User Model
 # -----------------------
 class User(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     username: str  # e.g., "johndoe"
     password: Optional[str] = ""  # hashed password or empty if using Google OAuth
     email: EmailStr  # using Pydantic's EmailStr for validation
     userId: str = Field(default_factory=lambda: str(uuid.uuid4()))  # unique identifier for the user
-    calendars: List[str] = []  # store calendarIds the user has
+    calendars: List[str] = Field(default_factory=list)  # store calendarIds the user has
     default_calendar_id: str = ""  # store the default calendarId for the user
     googleId: Optional[str] = ""  # Google OAuth ID
 
-    class Config:
-        allow_population_by_field_name = True
-
 # -----------------------
 # Calendar Color Enum
 # -----------------------
@@ -37,17 +36,16 @@ class CalendarColor(str, Enum):
 # Calendar Model
 # -----------------------
 class Calendar(BaseModel):
+    model_config = ConfigDict(use_enum_values=True)  # Ensures enums are serialized as their values
+
     calendarId: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str  # e.g., "John Doe's Personal Calendar"
     ownerId: str  # which user created/owns this calendar
     isGroup: bool = False  # personal vs. group
     isDefault: bool = False  # marks the default (home) calendar
-    members: List[str] = []  # for group calendars, store member userIds
+    members: List[str] = Field(default_factory=list)  # for group calendars, store member userIds
     color: CalendarColor = "blue"  # default color is blue
 
-    class Config:
-        use_enum_values = True  # Ensures enums are serialized as their values
-
 # -----------------------
 # Event Model
 # -----------------------
@@ -66,8 +64,8 @@ class Event(BaseModel):
     # recurrenceCount: Optional[int] = None  # total number of occurrences
     # seriesId: Optional[str] = None  # ID linking all occurrences in a series
 
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.replace(second=0, microsecond=0).isoformat()
-        }
+    @field_serializer("startTime", "endTime", when_used="json")
+    def serialize_minute(self, value: datetime) -> str:
+        # Stored/returned to the minute, e.g. 2021-08-01T09:00:00
+        return value.replace(second=0, microsecond=0).isoformat()
 
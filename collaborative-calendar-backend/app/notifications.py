@@ -6,6 +6,7 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import logging
 import datetime  # Added datetime module for proper date formatting
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -27,6 +28,76 @@ MAIL_USERNAME = os.getenv("MAIL_USERNAME")  # e.g., "myusername@gmail.com"
 MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")  # e.g., "my-secret-password"
 MAIL_FROM = os.getenv("MAIL_FROM")         # e.g., "no-reply@mydomain.com"
 
+# Notification emails are sent after the response goes out, so SMTP never blocks a request
+EMAIL_EXECUTOR_WORKERS = int(os.getenv("EMAIL_EXECUTOR_WORKERS", "4"))
+_email_executor = ThreadPoolExecutor(max_workers=EMAIL_EXECUTOR_WORKERS)
+
+
+def _log_email_failure(future):
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Background notification failed: %s", exc)
+
+
+def send_in_background(fn, *args, **kwargs):
+    """
+    Runs a notification callable on the email executor without waiting for it.
+    """
+    future = _email_executor.submit(fn, *args, **kwargs)
+    future.add_done_callback(_log_email_failure)
+    return future
+
+
+def _build_message(to_email: str, subject: str, body_text: str, body_html: str = None) -> MIMEMultipart:
+    """
+    Builds a multipart/alternative message with a plain-text part and an optional HTML part.
+    """
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = MAIL_FROM
+    msg["To"] = to_email
+
+    # Attach the plain-text part first.
+    msg.attach(MIMEText(body_text, "plain"))
+
+    # Attach the HTML part if provided.
+    if body_html:
+        msg.attach(MIMEText(body_html, "html"))
+    return msg
+
+
+def send_emails(messages: list) -> int:
+    """
+    Sends several emails over a single SMTP connection, so the TLS handshake and
+    login are paid once instead of once per recipient.
+    Returns the number of emails sent successfully.
+
+    :param messages: List of (to_email, subject, body_text, body_html) tuples;
+                     body_html may be None. Entries without a recipient are skipped.
+    """
+    messages = [message for message in messages if message[0]]
+    if not messages:
+        logger.warning("No recipient email provided. Skipping send_emails.")
+        return 0
+
+    sent = 0
+    try:
+        with smtplib.SMTP(MAIL_SERVER, MAIL_PORT) as server:
+            server.starttls()  # Secure the connection
+            server.login(MAIL_USERNAME, MAIL_PASSWORD)
+            for to_email, subject, body_text, body_html in messages:
+                try:
+                    msg = _build_message(to_email, subject, body_text, body_html)
+                    server.sendmail(MAIL_FROM, to_email, msg.as_string())
+                    sent += 1
+                    logger.info("Email sent successfully to %s", to_email)
+                except smtplib.SMTPException as e:
+                    logger.exception("Failed to send email to %s: %s", to_email, str(e))
+    except Exception as e:
+        logger.exception("Failed to send emails over SMTP: %s", str(e))
+    return sent
+
+
 def send_email(
     to_email: str,
     subject: str,
@@ -46,34 +117,7 @@ def send_email(
         logger.warning("No recipient email provided. Skipping send_email.")
         return False
 
-    try:
-        # Create a multipart/alternative container.
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = MAIL_FROM
-        msg["To"] = to_email
-
-        # Attach the plain-text part first.
-        part_text = MIMEText(body_text, "plain")
-        msg.attach(part_text)
-
-        # Attach the HTML part if provided.
-        if body_html:
-            part_html = MIMEText(body_html, "html")
-            msg.attach(part_html)
-
-        # Send the email via SMTP.
-        with smtplib.SMTP(MAIL_SERVER, MAIL_PORT) as server:
-            server.starttls()  # Secure the connection
-            server.login(MAIL_USERNAME, MAIL_PASSWORD)
-            server.sendmail(MAIL_FROM, to_email, msg.as_string())
-
-        logger.info("Email sent successfully to %s", to_email)
-        return True
-
-    except Exception as e:
-        logger.exception("Failed to send email to %s: %s", to_email, str(e))
-        return False
+    return send_emails([(to_email, subject, body_text, body_html)]) == 1
 
 # Modernized Base HTML Template with improved aesthetics
 BASE_HTML_TEMPLATE = """\
@@ -638,7 +682,7 @@ def send_welcome_email(to_email: str, username: str):
     else:
         logger.error("Failed to send welcome email to %s", to_email)
 
-def send_notification_email(
+def build_notification_email(
     to_email: str,
     username: str,
     message: str,
@@ -646,9 +690,10 @@ def send_notification_email(
     action_url: str = "https://sarveshmina.github.io/CAD-gwc-frontend/",
     ip_address: str = None,
     location: dict = None
-):
+) -> tuple:
     """
-    Sends a beautifully styled general notification email to a user.
+    Builds the general notification email as a (to_email, subject, body_text, body_html)
+    tuple, ready for send_email(*...) or for batching with send_emails.
 
     :param to_email: Recipient's email address.
     :param username: Recipient's username.
@@ -725,15 +770,27 @@ def send_notification_email(
         .replace("{{additional_content}}", additional_content)\
         .replace("{{action_url}}", action_url)\
         .replace("{{action_text}}", action_text)\
-        .replace("{{email}}", to_email)
+        .replace("{{email}}", to_email or "")
 
-    # Send the email
-    success = send_email(
-        to_email=to_email,
-        subject=subject,
-        body_text=body_text,
-        body_html=body_html
-    )
+    return to_email, subject, body_text, body_html
+
+
+def send_notification_email(
+    to_email: str,
+    username: str,
+    message: str,
+    action_text: str = "Visit Dashboard",
+    action_url: str = "https://sarveshmina.github.io/CAD-gwc-frontend/",
+    ip_address: str = None,
+    location: dict = None
+):
+    """
+    Sends a beautifully styled general notification email to a user.
+    See build_notification_email for the parameters.
+    """
+    success = send_email(*build_notification_email(
+        to_email, username, message, action_text, action_url, ip_address, location
+    ))
 
     if success:
         logger.info("Notification email sent to %s", to_email)
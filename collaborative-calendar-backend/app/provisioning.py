@@ -0,0 +1,172 @@
+# app/provisioning.py
+
+import logging
+from azure.cosmos import PartitionKey
+from azure.cosmos.exceptions import CosmosResourceExistsError
+
+from app.database import get_database, USERS_CONTAINER, CALENDARS_CONTAINER, EVENTS_CONTAINER
+
+logger = logging.getLogger(__name__)
+
+# -----------------------
+# Indexing policies
+# -----------------------
+# Only the paths we actually filter/sort on are indexed; everything else
+# ("/*") is excluded so writes don't pay RU to index free-text fields.
+USERS_INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "includedPaths": [
+        {"path": "/userId/?"},
+        {"path": "/username/?"},
+        {"path": "/email/?"},
+        {"path": "/googleId/?"}
+    ],
+    "excludedPaths": [
+        {"path": "/*"}
+    ]
+}
+
+CALENDARS_INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "includedPaths": [
+        {"path": "/calendarId/?"},
+        {"path": "/ownerId/?"},
+        {"path": "/members/*"}
+    ],
+    "excludedPaths": [
+        {"path": "/*"}
+    ]
+}
+
+EVENTS_INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "includedPaths": [
+        {"path": "/calendarId/?"},
+        {"path": "/eventId/?"},
+        {"path": "/startTime/?"},
+        {"path": "/endTime/?"}
+    ],
+    "excludedPaths": [
+        {"path": "/description/?"},
+        {"path": "/*"}
+    ],
+    # Lets time-range scans within a calendar (including the add_event
+    # conflict check on startTime/endTime) be served by an index seek
+    "compositeIndexes": [
+        [
+            {"path": "/calendarId", "order": "ascending"},
+            {"path": "/startTime", "order": "ascending"}
+        ],
+        [
+            {"path": "/calendarId", "order": "ascending"},
+            {"path": "/startTime", "order": "ascending"},
+            {"path": "/endTime", "order": "ascending"}
+        ]
+    ]
+}
+
+# container name -> (partition key path, indexing policy)
+CONTAINER_SETTINGS = {
+    USERS_CONTAINER: ("/userId", USERS_INDEXING_POLICY),
+    CALENDARS_CONTAINER: ("/calendarId", CALENDARS_INDEXING_POLICY),
+    EVENTS_CONTAINER: ("/calendarId", EVENTS_INDEXING_POLICY),
+}
+
+# -----------------------
+# Stored procedures
+# -----------------------
+# Deletes every event of one calendar inside its partition. Runs until it
+# is out of time/RU budget and reports whether the caller must call it again.
+BULK_DELETE_SPROC_ID = "bulkDeleteByCalendar"
+BULK_DELETE_SPROC_BODY = """
+function bulkDeleteByCalendar(calendarId) {
+    var collection = getContext().getCollection();
+    var collectionLink = collection.getSelfLink();
+    var response = getContext().getResponse();
+    var responseBody = { deleted: 0, continuation: true };
+
+    tryQueryAndDelete();
+
+    function tryQueryAndDelete(continuation) {
+        var query = {
+            query: "SELECT e._self FROM Events e WHERE e.calendarId = @calId",
+            parameters: [{ name: "@calId", value: calendarId }]
+        };
+        var isAccepted = collection.queryDocuments(collectionLink, query, { continuation: continuation },
+            function (err, documents, responseOptions) {
+                if (err) throw err;
+                if (documents.length > 0) {
+                    tryDelete(documents);
+                } else if (responseOptions.continuation) {
+                    tryQueryAndDelete(responseOptions.continuation);
+                } else {
+                    responseBody.continuation = false;
+                    response.setBody(responseBody);
+                }
+            });
+        if (!isAccepted) {
+            response.setBody(responseBody);
+        }
+    }
+
+    function tryDelete(documents) {
+        if (documents.length > 0) {
+            var isAccepted = collection.deleteDocument(documents[0]._self, {}, function (err) {
+                if (err) throw err;
+                responseBody.deleted++;
+                documents.shift();
+                tryDelete(documents);
+            });
+            if (!isAccepted) {
+                response.setBody(responseBody);
+            }
+        } else {
+            tryQueryAndDelete();
+        }
+    }
+}
+"""
+
+
+def ensure_stored_procedures(events_container):
+    """
+    Registers the stored procedures used by the app on the Events container.
+    Already registered procedures are left untouched.
+    """
+    try:
+        events_container.scripts.create_stored_procedure(
+            body={"id": BULK_DELETE_SPROC_ID, "body": BULK_DELETE_SPROC_BODY}
+        )
+        logger.info("Stored procedure '%s' registered", BULK_DELETE_SPROC_ID)
+    except CosmosResourceExistsError:
+        pass
+
+
+def ensure_containers():
+    """
+    Creates the containers if they don't exist, applies the indexing policies above
+    and registers the stored procedures.
+    Safe to run repeatedly; existing containers keep their data and partition key.
+    """
+    database = get_database()
+    for name, (pk_path, indexing_policy) in CONTAINER_SETTINGS.items():
+        partition_key = PartitionKey(path=pk_path)
+        container = database.create_container_if_not_exists(
+            id=name,
+            partition_key=partition_key,
+            indexing_policy=indexing_policy
+        )
+        database.replace_container(
+            container,
+            partition_key=partition_key,
+            indexing_policy=indexing_policy
+        )
+        logger.info("Indexing policy applied to container '%s'", name)
+
+        if name == EVENTS_CONTAINER:
+            ensure_stored_procedures(container)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    ensure_containers()
@@ -0,0 +1,71 @@
+# app/serialization.py
+
+import logging
+from functools import wraps
+
+import orjson
+from azure.functions import HttpResponse
+
+# JSON helpers shared by every HTTP handler. orjson encodes straight to UTF-8
+# bytes, which HttpResponse takes as its body without another encode step.
+
+JSON_MIMETYPE = "application/json"
+_ERROR_PREFIX = b'{"error":'
+_ERR_INVALID_JSON = b'{"error":"Request body is not valid JSON"}'
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(obj) -> bytes:
+    """
+    Serializes a response body to JSON bytes.
+    """
+    return orjson.dumps(obj)
+
+
+def loads(data):
+    """
+    Parses JSON from bytes or str. Raises ValueError (orjson.JSONDecodeError) on invalid input.
+    """
+    return orjson.loads(data)
+
+
+def parse_json(req):
+    """
+    Parses an HttpRequest's JSON body straight from its raw bytes, skipping the
+    worker's stdlib decoder. Like req.get_json(), raises ValueError on invalid JSON.
+    """
+    return orjson.loads(req.get_body())
+
+
+def json_response(body: bytes, status_code: int = 200) -> HttpResponse:
+    """
+    Wraps an already encoded JSON body in an HttpResponse.
+    """
+    return HttpResponse(body=body, status_code=status_code, mimetype=JSON_MIMETYPE)
+
+
+def error_response(message, status_code: int = 500) -> HttpResponse:
+    """
+    Builds an {"error": message} response. Only the message is encoded; the
+    surrounding object is a prebuilt prefix, and orjson still escapes the text.
+    """
+    return json_response(_ERROR_PREFIX + orjson.dumps(str(message)) + b"}", status_code)
+
+
+def json_endpoint(fn):
+    """
+    Wraps an HTTP handler so it doesn't need its own try/except: a body that is not
+    valid JSON gets a 400, any other uncaught exception is logged and turned into a 500.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except orjson.JSONDecodeError as e:
+            logger.warning("Invalid JSON body in %s: %s", fn.__name__, e)
+            return json_response(_ERR_INVALID_JSON, 400)
+        except Exception as e:
+            logger.exception("Error in %s", fn.__name__)
+            return error_response(e, 500)
+    return wrapper
@@ -4,24 +4,26 @@ import random
 import string
 import datetime
 import bcrypt
-import json
 import logging
-from azure.cosmos.exceptions import CosmosResourceExistsError, CosmosHttpResponseError
-import azure.functions as func
+from azure.cosmos.exceptions import CosmosResourceExistsError, CosmosHttpResponseError, CosmosResourceNotFoundError
 import os
 from dotenv import load_dotenv
 
 from google.auth.transport import requests as google_requests
 from google.oauth2 import id_token
 
-from app.database import user_container, calendars_container
+from app.cache import invalidate_user, remember_user
+from app import database
+from app.database import query_first, query_params
 from app.models import User, Calendar
+from app.serialization import dumps, error_response, json_response, parse_json
 from app.notifications import (
     send_email,
     send_welcome_email,
     send_login_notification,
     send_password_reset_notification,
-    send_notification_email
+    send_notification_email,
+    send_in_background
 )
 
 load_dotenv()
@@ -52,23 +54,21 @@ def register_user(user_data: User, client_ip: str, location: dict):
 
     try:
         # Check if username already exists
-        existing_user = list(
-            user_container.query_items(
-                query="SELECT * FROM Users u WHERE u.username = @username",
-                parameters=[{"name": "@username", "value": user_data.username}],
-                enable_cross_partition_query=True
-            )
+        existing_user = query_first(
+            database.user_container,
+            query="SELECT TOP 1 VALUE u.id FROM Users u WHERE u.username = @username",
+            parameters=query_params(username=user_data.username),
+            enable_cross_partition_query=True
         )
         if existing_user:
             return {"error": "Username already exists"}, 400
 
         # Check if email already exists
-        existing_email = list(
-            user_container.query_items(
-                query="SELECT * FROM Users u WHERE u.email = @email",
-                parameters=[{"name": "@email", "value": user_data.email}],
-                enable_cross_partition_query=True
-            )
+        existing_email = query_first(
+            database.user_container,
+            query="SELECT TOP 1 VALUE u.id FROM Users u WHERE u.email = @email",
+            parameters=query_params(email=user_data.email),
+            enable_cross_partition_query=True
         )
         if existing_email:
             return {"error": "Email is already registered"}, 400
@@ -78,11 +78,11 @@ def register_user(user_data: User, client_ip: str, location: dict):
         user_data.password = hashed_password.decode("utf-8")
 
         # Build user document
-        user_item = user_data.dict()
+        user_item = user_data.model_dump()
         user_item["id"] = user_data.userId  # Ensure 'id' is set for Cosmos DB
 
         # Create user document in Cosmos DB
-        user_container.create_item(body=user_item)
+        database.user_container.create_item(body=user_item)
 
         # Create default/home calendar
         home_cal = Calendar(
@@ -92,24 +92,28 @@ def register_user(user_data: User, client_ip: str, location: dict):
             isDefault=True,
             members=[user_data.userId]
         )
-        home_cal_dict = home_cal.dict()
+        home_cal_dict = home_cal.model_dump()
         home_cal_dict["id"] = home_cal.calendarId  # Ensure 'id' is set for Cosmos DB
         home_cal_dict["color"] = "blue"
 
         # Create calendar document in Cosmos DB
-        calendars_container.create_item(body=home_cal_dict)
+        database.calendars_container.create_item(body=home_cal_dict)
 
         # Update user with default_calendar_id
         user_data.calendars.append(home_cal.calendarId)
         user_data.default_calendar_id = home_cal.calendarId
 
         # Upsert updated user document with calendar info
-        updated_user_item = user_data.dict()
+        updated_user_item = user_data.model_dump()
         updated_user_item["id"] = user_data.userId
-        user_container.upsert_item(body=updated_user_item)
+        database.user_container.upsert_item(body=updated_user_item)
+
+        # Drop any stale mapping for this username and prime the lookup cache
+        invalidate_user(username=user_data.username)
+        remember_user(user_data.userId, user_data.username)
 
         # Send "account created" email
-        send_welcome_email(user_data.email, user_data.username)
+        send_in_background(send_welcome_email, user_data.email, user_data.username)
 
         # Optionally, send additional registration details with IP and location
         # send_registration_notification(user_data.email, user_data.username, client_ip, location)
@@ -146,18 +150,16 @@ def login_user(username: str, password: str, client_ip: str, location: dict):
     logger.info("Received login request for username: %s from IP: %s", username, client_ip)
 
     try:
-        user_query = list(
-            user_container.query_items(
-                query="SELECT * FROM Users u WHERE u.username = @username",
-                parameters=[{"name": "@username", "value": username}],
-                enable_cross_partition_query=True
-            )
+        user_doc = query_first(
+            database.user_container,
+            query="SELECT TOP 1 * FROM Users u WHERE u.username = @username",
+            parameters=query_params(username=username),
+            enable_cross_partition_query=True
         )
-        if not user_query:
+        if user_doc is None:
             logger.warning("Login failed: user '%s' not found", username)
             return {"error": "User not found"}, 404
 
-        user_doc = user_query[0]
         if bcrypt.checkpw(password.encode("utf-8"), user_doc["password"].encode("utf-8")):
             logger.info("User '%s' logged in successfully from IP: %s", username, client_ip)
             
@@ -165,7 +167,8 @@ def login_user(username: str, password: str, client_ip: str, location: dict):
             # location = "get_geolocation(client_ip)"  # Removed
             
             # Send login notification email with IP and location
-            send_login_notification(
+            send_in_background(
+                send_login_notification,
                 to_email=user_doc["email"],
                 username=user_doc["username"],
                 ip_address=client_ip,
@@ -203,18 +206,12 @@ def update_user_profile(user_id: str, updates: dict):
     """
     logger.info("User '%s' requested profile update.", user_id)
     try:
-        # 1) Fetch the user doc
-        user_query = list(
-            user_container.query_items(
-                query="SELECT * FROM Users u WHERE u.userId = @userId",
-                parameters=[{"name": "@userId", "value": user_id}],
-                enable_cross_partition_query=True
-            )
-        )
-        if not user_query:
+        # 1) Fetch the user doc (point read: id is the userId, which is also the partition key)
+        try:
+            user_doc = database.user_container.read_item(item=user_id, partition_key=user_id)
+        except CosmosResourceNotFoundError:
             return {"error": "User not found"}, 404
 
-        user_doc = user_query[0]
 
         # 2) Update permitted fields
         updated = False
@@ -227,15 +224,14 @@ def update_user_profile(user_id: str, updates: dict):
                     if not (5 <= len(new_val) <= 15):
                         return {"error": "Username must be 5-15 characters"}, 400
                     # Check if the new username already exists
-                    existing_user = list(
-                        user_container.query_items(
-                            query="SELECT * FROM Users u WHERE u.username = @username AND u.userId != @userId",
-                            parameters=[
-                                {"name": "@username", "value": new_val},
-                                {"name": "@userId", "value": user_id}
-                            ],
-                            enable_cross_partition_query=True
-                        )
+                    existing_user = query_first(
+                        database.user_container,
+                        query="SELECT TOP 1 VALUE u.id FROM Users u WHERE u.username = @username AND u.userId != @userId",
+                        parameters=query_params(
+                            username=new_val,
+                            userId=user_id
+                        ),
+                        enable_cross_partition_query=True
                     )
                     if existing_user:
                         return {"error": "Username already exists"}, 400
@@ -246,15 +242,14 @@ def update_user_profile(user_id: str, updates: dict):
                     if "@" not in new_val or "." not in new_val:
                         return {"error": "Invalid email address"}, 400
                     # Check if the new email already exists
-                    existing_email = list(
-                        user_container.query_items(
-                            query="SELECT * FROM Users u WHERE u.email = @email AND u.userId != @userId",
-                            parameters=[
-                                {"name": "@email", "value": new_val},
-                                {"name": "@userId", "value": user_id}
-                            ],
-                            enable_cross_partition_query=True
-                        )
+                    existing_email = query_first(
+                        database.user_container,
+                        query="SELECT TOP 1 VALUE u.id FROM Users u WHERE u.email = @email AND u.userId != @userId",
+                        parameters=query_params(
+                            email=new_val,
+                            userId=user_id
+                        ),
+                        enable_cross_partition_query=True
                     )
                     if existing_email:
                         return {"error": "Email is already registered"}, 400
@@ -272,7 +267,9 @@ def update_user_profile(user_id: str, updates: dict):
             return {"error": "No valid fields to update"}, 400
 
         # 3) Upsert the updated user doc
-        user_container.upsert_item(body=user_doc)
+        database.user_container.upsert_item(body=user_doc)
+        # Clears the old username's mapping (via the userId) and any stale one for the new name
+        invalidate_user(user_id=user_id, username=user_doc["username"])
 
         # 4) Send "profile updated" email
         subject = "Your Profile Was Updated"
@@ -282,7 +279,7 @@ def update_user_profile(user_id: str, updates: dict):
             "If you did not make this change, please contact support immediately.\n\n"
             "Best,\nCalendify Team"
         )
-        send_email(user_doc["email"], subject, body_text)
+        send_in_background(send_email, user_doc["email"], subject, body_text)
 
         return {"message": "User updated successfully"}, 200
 
@@ -310,23 +307,23 @@ def forgot_password_request(req):
         HttpResponse: The HTTP response indicating success or failure.
     """
     try:
-        req_body = req.get_json()
+        req_body = parse_json(req)
         email = req_body.get("email")
 
         if not email:
-            return func.HttpResponse(json.dumps({"error": "Email is required"}), status_code=400, mimetype="application/json")
+            return json_response(dumps({"error": "Email is required"}), 400)
 
         # Fetch user from DB
-        user_query = list(user_container.query_items(
-            query="SELECT * FROM Users u WHERE u.email = @email",
-            parameters=[{"name": "@email", "value": email}],
+        user_doc = query_first(
+            database.user_container,
+            query="SELECT TOP 1 * FROM Users u WHERE u.email = @email",
+            parameters=query_params(email=email),
             enable_cross_partition_query=True
-        ))
+        )
 
-        if not user_query:
-            return func.HttpResponse(json.dumps({"error": "User not found"}), status_code=404, mimetype="application/json")
+        if user_doc is None:
+            return json_response(dumps({"error": "User not found"}), 404)
 
-        user_doc = user_query[0]
         user_id = user_doc["userId"]
 
         # Generate OTP
@@ -337,18 +334,18 @@ def forgot_password_request(req):
         user_doc["reset_otp"] = otp
         user_doc["otp_expiry"] = expiry_time.isoformat()
 
-        user_container.upsert_item(user_doc)
+        database.user_container.upsert_item(user_doc)
 
         # Send OTP email
         subject = "Password Reset OTP"
         message = f"Your OTP for password reset is: {otp}. This OTP is valid for 10 minutes."
-        send_notification_email(email, user_doc["username"], message)
+        send_in_background(send_notification_email, email, user_doc["username"], message)
 
-        return func.HttpResponse(json.dumps({"message": "OTP sent successfully"}), status_code=200, mimetype="application/json")
+        return json_response(dumps({"message": "OTP sent successfully"}), 200)
 
     except Exception as e:
         logger.exception("Error in forgot_password_request: %s", str(e))
-        return func.HttpResponse(json.dumps({"error": str(e)}), status_code=500, mimetype="application/json")
+        return error_response(e, 500)
 
 
 def reset_password(req, client_ip: str, location: dict):
@@ -364,43 +361,43 @@ def reset_password(req, client_ip: str, location: dict):
         HttpResponse: The HTTP response indicating success or failure.
     """
     try:
-        req_body = req.get_json()
+        req_body = parse_json(req)
         email = req_body.get("email")
         otp = req_body.get("otp")
         new_password = req_body.get("newPassword")
 
         if not email or not otp or not new_password:
-            return func.HttpResponse(json.dumps({"error": "Email, OTP, and new password are required"}), status_code=400, mimetype="application/json")
+            return json_response(dumps({"error": "Email, OTP, and new password are required"}), 400)
 
         # Fetch user from DB
-        user_query = list(user_container.query_items(
-            query="SELECT * FROM Users u WHERE u.email = @email",
-            parameters=[{"name": "@email", "value": email}],
+        user_doc = query_first(
+            database.user_container,
+            query="SELECT TOP 1 * FROM Users u WHERE u.email = @email",
+            parameters=query_params(email=email),
             enable_cross_partition_query=True
-        ))
+        )
 
-        if not user_query:
-            return func.HttpResponse(json.dumps({"error": "User not found"}), status_code=404, mimetype="application/json")
+        if user_doc is None:
+            return json_response(dumps({"error": "User not found"}), 404)
 
-        user_doc = user_query[0]
 
         # Validate OTP
         stored_otp = user_doc.get("reset_otp")
         otp_expiry = user_doc.get("otp_expiry")
 
         if not stored_otp or not otp_expiry:
-            return func.HttpResponse(json.dumps({"error": "No OTP request found"}), status_code=400, mimetype="application/json")
+            return json_response(dumps({"error": "No OTP request found"}), 400)
 
         # Check OTP validity
         if stored_otp != otp:
-            return func.HttpResponse(json.dumps({"error": "Invalid OTP"}), status_code=400, mimetype="application/json")
+            return json_response(dumps({"error": "Invalid OTP"}), 400)
 
         if datetime.datetime.utcnow() > datetime.datetime.fromisoformat(otp_expiry):
-            return func.HttpResponse(json.dumps({"error": "OTP expired"}), status_code=400, mimetype="application/json")
+            return json_response(dumps({"error": "OTP expired"}), 400)
 
         # Validate new password length
         if not (8 <= len(new_password) <= 15):
-            return func.HttpResponse(json.dumps({"error": "Password must be between 8 and 15 characters"}), status_code=400, mimetype="application/json")
+            return json_response(dumps({"error": "Password must be between 8 and 15 characters"}), 400)
 
         # Hash new password
         hashed_password = bcrypt.hashpw(new_password.encode("utf-8"), bcrypt.gensalt())
@@ -410,24 +407,25 @@ def reset_password(req, client_ip: str, location: dict):
         user_doc.pop("reset_otp", None)
         user_doc.pop("otp_expiry", None)
 
-        user_container.upsert_item(user_doc)
+        database.user_container.upsert_item(user_doc)
 
         # Send a confirmation email about password reset, including IP and location
-        send_password_reset_notification(
+        send_in_background(
+            send_password_reset_notification,
             to_email=user_doc["email"],
             username=user_doc["username"],
             ip_address=client_ip,
             location=location  # Ensure this is a dict
         )
 
-        return func.HttpResponse(json.dumps({"message": "Password reset successful"}), status_code=200, mimetype="application/json")
+        return json_response(dumps({"message": "Password reset successful"}), 200)
 
     except CosmosHttpResponseError as e:
         logger.exception("Cosmos HTTP error during password reset for user '%s': %s", email, str(e))
-        return func.HttpResponse(json.dumps({"error": f"(BadRequest) {str(e)}"}), status_code=500, mimetype="application/json")
+        return json_response(dumps({"error": f"(BadRequest) {str(e)}"}), 500)
     except Exception as e:
         logger.exception("Unexpected error during password reset for user '%s': %s", email, str(e))
-        return func.HttpResponse(json.dumps({"error": "An unexpected error occurred during password reset."}), status_code=500, mimetype="application/json")
+        return json_response(dumps({"error": "An unexpected error occurred during password reset."}), 500)
 
 
 def google_oauth_login(id_token_str: str, client_ip: str, location: dict):
@@ -457,23 +455,21 @@ def google_oauth_login(id_token_str: str, client_ip: str, location: dict):
             return {"error": "Invalid Google token: missing email or sub"}, 400
 
         # 1. Check if a user with googleId=<google_id> or email=<email> already exists
-        user_query = list(
-            user_container.query_items(
-                query="""
-                    SELECT * FROM Users u 
-                     WHERE (u.googleId = @googleId) OR (u.email = @email)
-                """,
-                parameters=[
-                    {"name": "@googleId", "value": google_id},
-                    {"name": "@email", "value": email}
-                ],
-                enable_cross_partition_query=True
-            )
+        user_doc = query_first(
+            database.user_container,
+            query="""
+                SELECT TOP 1 * FROM Users u 
+                 WHERE (u.googleId = @googleId) OR (u.email = @email)
+            """,
+            parameters=query_params(
+                googleId=google_id,
+                email=email
+            ),
+            enable_cross_partition_query=True
         )
 
-        if user_query:
+        if user_doc:
             # Existing user -> "Login successful"
-            user_doc = user_query[0]
             return {
                 "message": "Login successful (Google OAuth)",
                 "userId": user_doc["userId"],
@@ -492,11 +488,11 @@ def google_oauth_login(id_token_str: str, client_ip: str, location: dict):
             )
             
             # We also create them in DB; do the same steps as in register_user
-            new_user_item = new_user.dict()
+            new_user_item = new_user.model_dump()
             new_user_item["id"] = new_user_item["userId"]  # for Cosmos DB
 
             # Insert into user_container
-            user_container.create_item(body=new_user_item)
+            database.user_container.create_item(body=new_user_item)
 
             # Optionally, create a default/home calendar (like register_user does)
             home_cal = Calendar(
@@ -507,18 +503,20 @@ def google_oauth_login(id_token_str: str, client_ip: str, location: dict):
                 members=[new_user.userId],
                 color="blue"
             )
-            home_cal_dict = home_cal.dict()
+            home_cal_dict = home_cal.model_dump()
             home_cal_dict["id"] = home_cal.calendarId
 
-            calendars_container.create_item(body=home_cal_dict)
+            database.calendars_container.create_item(body=home_cal_dict)
 
             # Update user doc with references
             new_user.calendars.append(home_cal.calendarId)
             new_user.default_calendar_id = home_cal.calendarId
-            user_container.upsert_item(new_user.dict())
+            database.user_container.upsert_item(new_user.model_dump())
+            invalidate_user(username=new_user.username)
+            remember_user(new_user.userId, new_user.username)
 
             # Optionally send "Welcome" email
-            send_welcome_email(new_user.email, new_user.username)
+            send_in_background(send_welcome_email, new_user.email, new_user.username)
 
             return {
                 "message": "User registered successfully via Google OAuth",
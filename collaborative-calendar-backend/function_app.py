@@ -2,10 +2,8 @@
 
 import azure.functions as func
 import logging
-import json
 
 from app.main import (
-    register, login,
     create_event, list_events,
     create_group, add_user_to_group, remove_user_from_group,
     func_create_personal_calendar, delete_personal,
@@ -14,12 +12,8 @@ from app.main import (
     edit_group_calendar_handler, leave_group_calendar_handler,
     update_user_handler, delete_group_calendar_handler
 )
-from app.user_routes import google_oauth_login
 from app.utils import get_client_ip, get_geolocation
-from app.calendar_routes import import_internet_calendar
-from pydantic import ValidationError
-from app.models import User
-from app.user_routes import login_user, register_user
+from app.serialization import dumps, error_response, json_endpoint, json_response, parse_json
 
 
 logger = logging.getLogger(__name__)
@@ -34,89 +28,79 @@ if not logger.hasHandlers():
 
 app = func.FunctionApp()
 
+@app.warm_up_trigger(arg_name="warmup")
+def warmup_function(warmup) -> None:
+    """
+    Runs when the platform adds a new instance (Premium/Dedicated plans), before it
+    receives traffic. Does the first-call work up front: imports the route modules
+    and builds the shared Cosmos client and container clients.
+    """
+    from app import calendar_routes, user_routes
+    from app.database import get_container, USERS_CONTAINER, CALENDARS_CONTAINER, EVENTS_CONTAINER
+
+    for name in (USERS_CONTAINER, CALENDARS_CONTAINER, EVENTS_CONTAINER):
+        get_container(name)
+    logger.info("Instance warmed up")
+
 @app.route(route="register", methods=["POST"])
+@json_endpoint
 def register_function(req: func.HttpRequest) -> func.HttpResponse:
+    from pydantic import ValidationError
+    from app.models import User
+    from app.user_routes import register_user
+
     try:
-        req_body = req.get_json()
-        user = User(**req_body)
-        client_ip = get_client_ip(req)
-        location = get_geolocation(client_ip)
-        
-        response, status_code = register_user(user, client_ip, location)
-        return func.HttpResponse(json.dumps(response), status_code=status_code, mimetype="application/json")
+        # Parsed and validated in one pass by pydantic-core, without an intermediate dict
+        user = User.model_validate_json(req.get_body())
     except ValidationError as ve:
-        logger.exception("Validation error in register endpoint: %s", str(ve))
-        return func.HttpResponse(json.dumps({"error": str(ve)}), status_code=422, mimetype="application/json")
-    except Exception as e:
-        logger.exception("Error in register endpoint: %s", str(e))
-        return func.HttpResponse(json.dumps({"error": str(e)}), status_code=500, mimetype="application/json")
+        # Client input error: no traceback needed
+        logger.warning("Validation error in register endpoint: %s", ve)
+        return error_response(ve, 422)
+
+    client_ip = get_client_ip(req)
+    location = get_geolocation(client_ip)
+
+    response, status_code = register_user(user, client_ip, location)
+    return json_response(dumps(response), status_code)
 
 
 @app.route(route="login", methods=["POST"])
+@json_endpoint
 def login_function(req: func.HttpRequest) -> func.HttpResponse:
-    try:
-        req_body = req.get_json()
-        username = req_body.get("username")
-        password = req_body.get("password")
-
-        if not username or not password:
-            return func.HttpResponse(
-                json.dumps({"error": "Missing credentials"}),
-                status_code=400,
-                mimetype="application/json"
-            )
-        
-        client_ip = get_client_ip(req)
-        location = get_geolocation(client_ip)
-        
-        response, status_code = login_user(username, password, client_ip, location)
-        return func.HttpResponse(json.dumps(response), status_code=status_code, mimetype="application/json")
-    except ValidationError as ve:
-        logger.exception("Validation error in login endpoint: %s", str(ve))
-        return func.HttpResponse(json.dumps({"error": str(ve)}), status_code=422, mimetype="application/json")
-    except Exception as e:
-        logger.exception("Error in login endpoint: %s", str(e))
-        return func.HttpResponse(json.dumps({"error": str(e)}), status_code=500, mimetype="application/json")
+    from app.user_routes import login_user
+
+    req_body = parse_json(req)
+    username = req_body.get("username")
+    password = req_body.get("password")
+
+    if not username or not password:
+        return json_response(dumps({"error": "Missing credentials"}), 400)
+    
+    client_ip = get_client_ip(req)
+    location = get_geolocation(client_ip)
+    
+    response, status_code = login_user(username, password, client_ip, location)
+    return json_response(dumps(response), status_code)
 
 
 @app.route(route="user/{user_id}/profile", methods=["GET"])
+@json_endpoint
 def get_user_profile(req: func.HttpRequest) -> func.HttpResponse:
-    import json
+    from azure.cosmos.exceptions import CosmosResourceNotFoundError
     from app.database import user_container
-    import azure.functions as func
 
+    user_id = req.route_params.get("user_id")
+    # userId is both the document id and the partition key: a point read
     try:
-        user_id = req.route_params.get("user_id")
-        user_query = list(
-            user_container.query_items(
-                query="SELECT * FROM Users u WHERE u.userId = @userId",
-                parameters=[{"name": "@userId", "value": user_id}],
-                enable_cross_partition_query=True
-            )
-        )
-        if not user_query:
-            return func.HttpResponse(
-                json.dumps({"error": "User not found"}),
-                status_code=404,
-                mimetype="application/json"
-            )
-
-        user_doc = user_query[0]
-        user_profile = {
-            "username": user_doc.get("username", ""),
-            "email": user_doc.get("email", "")
-        }
-        return func.HttpResponse(
-            json.dumps(user_profile),
-            status_code=200,
-            mimetype="application/json"
-        )
-    except Exception as e:
-        return func.HttpResponse(
-            json.dumps({"error": str(e)}),
-            status_code=500,
-            mimetype="application/json"
-        )
+        user_doc = user_container.read_item(item=user_id, partition_key=user_id)
+    except CosmosResourceNotFoundError:
+        return json_response(dumps({"error": "User not found"}), 404)
+
+    user_profile = {
+        "username": user_doc.get("username", ""),
+        "email": user_doc.get("email", "")
+    }
+    return json_response(dumps(user_profile), 200)
 
 @app.route(route="calendar/{calendar_id}/event", methods=["POST"])
 def create_event_function(req: func.HttpRequest) -> func.HttpResponse:
@@ -186,28 +170,13 @@ def delete_personal_calendar_function(req: func.HttpRequest) -> func.HttpRespons
     return delete_personal(req, calendar_id)
 
 @app.route(route="user/{user_id}/calendars", methods=["GET"])
+@json_endpoint
 def list_user_calendars(req: func.HttpRequest) -> func.HttpResponse:
     from app.calendar_routes import get_user_calendars
-    import json
-    import logging
-
-    logger = logging.getLogger(__name__)
 
-    try:
-        user_id = req.route_params.get("user_id")
-        response, status_code = get_user_calendars(user_id)
-        return func.HttpResponse(
-            json.dumps(response),
-            status_code=status_code,
-            mimetype="application/json"
-        )
-    except Exception as e:
-        logger.exception("Error in list_user_calendars endpoint: %s", str(e))
-        return func.HttpResponse(
-            json.dumps({"error": str(e)}),
-            status_code=500,
-            mimetype="application/json"
-        )
+    user_id = req.route_params.get("user_id")
+    response, status_code = get_user_calendars(user_id)
+    return json_response(dumps(response), status_code)
 
 @app.route(route="user/{user_id}", methods=["PUT"])
 def update_user_function(req: func.HttpRequest) -> func.HttpResponse:
@@ -219,38 +188,24 @@ def forgot_password_function(req: func.HttpRequest) -> func.HttpResponse:
     return forgot_password_request(req)
 
 @app.route(route="reset-password", methods=["POST"])
+@json_endpoint
 def reset_password_function(req: func.HttpRequest) -> func.HttpResponse:
     from app.user_routes import reset_password
-    try:
-        client_ip = get_client_ip(req)
-        location = get_geolocation(client_ip)
-        return reset_password(req, client_ip, location)
-    except Exception as e:
-        logger.exception("Error in reset_password_handler: %s", str(e))
-        return func.HttpResponse(
-            json.dumps({"error": str(e)}),
-            status_code=500,
-            mimetype="application/json"
-        )
+    client_ip = get_client_ip(req)
+    location = get_geolocation(client_ip)
+    return reset_password(req, client_ip, location)
 
 @app.route(route="personal-calendar/{calendar_id}/edit", methods=["PUT"])
+@json_endpoint
 def edit_personal_calendar_function(req: func.HttpRequest) -> func.HttpResponse:
     from app.calendar_routes import edit_personal_calendar
     calendar_id = req.route_params.get("calendar_id")
-    updated_data = req.get_json()
+    updated_data = parse_json(req)
     user_id = req.headers.get("user_id")
     if not user_id:
-        return func.HttpResponse(
-            json.dumps({"error": "User ID is required"}),
-            status_code=400,
-            mimetype="application/json"
-        )
+        return json_response(dumps({"error": "User ID is required"}), 400)
     response_body, status_code = edit_personal_calendar(calendar_id, user_id, updated_data)
-    return func.HttpResponse(
-        body=json.dumps(response_body),
-        status_code=status_code,
-        mimetype="application/json"
-    )
+    return json_response(dumps(response_body), status_code)
 
 @app.route(route="group-calendar/{calendar_id}/delete", methods=["POST"])
 def delete_group_calendar_function(req: func.HttpRequest) -> func.HttpResponse:
@@ -258,64 +213,32 @@ def delete_group_calendar_function(req: func.HttpRequest) -> func.HttpResponse:
     return delete_group_calendar_handler(req, calendar_id)
 
 @app.route(route="calendar/import", methods=["POST"])
+@json_endpoint
 def import_calendar_function(req: func.HttpRequest) -> func.HttpResponse:
-    try:
-        body = req.get_json()
-        user_id = body.get("userId")
-        ical_url = body.get("iCalURL")
-        name = body.get("name", '')
-        color = body.get("color", 'blue')
-        if not user_id or not ical_url:
-            return func.HttpResponse(
-                json.dumps({"error": "Missing userId or iCalURL in request body."}),
-                status_code=400,
-                mimetype="application/json"
-            )
-        from app.calendar_routes import import_internet_calendar
-        response_body, status_code = import_internet_calendar(user_id, ical_url, name, color)
-        return func.HttpResponse(
-            json.dumps(response_body),
-            status_code=status_code,
-            mimetype="application/json"
-        )
-    except Exception as e:
-        logger.exception("Error in import_calendar_function: %s", str(e))
-        return func.HttpResponse(
-            json.dumps({"error": str(e)}),
-            status_code=500,
-            mimetype="application/json"
-        )
+    from app.calendar_routes import import_internet_calendar
+
+    body = parse_json(req)
+    user_id = body.get("userId")
+    ical_url = body.get("iCalURL")
+    name = body.get("name", '')
+    color = body.get("color", 'blue')
+    if not user_id or not ical_url:
+        return json_response(dumps({"error": "Missing userId or iCalURL in request body."}), 400)
+    response_body, status_code = import_internet_calendar(user_id, ical_url, name, color)
+    return json_response(dumps(response_body), status_code)
 
 @app.route(route="auth/google", methods=["POST"])
+@json_endpoint
 def google_auth_function(req: func.HttpRequest) -> func.HttpResponse:
-    import json
-    import logging
-    
-    logger = logging.getLogger(__name__)
+    from app.user_routes import google_oauth_login
 
-    try:
-        body = req.get_json()
-        id_token_str = body.get("idToken")
-        if not id_token_str:
-            return func.HttpResponse(
-                json.dumps({"error": "Missing idToken in request body."}),
-                status_code=400,
-                mimetype="application/json"
-            )
-        
-        client_ip = get_client_ip(req)
-        location = get_geolocation(client_ip)
-        response, status_code = google_oauth_login(id_token_str, client_ip, location)
-        
-        return func.HttpResponse(
-            json.dumps(response),
-            status_code=status_code,
-            mimetype="application/json"
-        )
-    except Exception as e:
-        logger.exception("Error in google_auth_function: %s", str(e))
-        return func.HttpResponse(
-            json.dumps({"error": str(e)}),
-            status_code=500,
-            mimetype="application/json"
-        )
+    body = parse_json(req)
+    id_token_str = body.get("idToken")
+    if not id_token_str:
+        return json_response(dumps({"error": "Missing idToken in request body."}), 400)
+    
+    client_ip = get_client_ip(req)
+    location = get_geolocation(client_ip)
+    response, status_code = google_oauth_login(id_token_str, client_ip, location)
+    
+    return json_response(dumps(response), status_code)